@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2015 Spotify AB
 
+__version__ = '1.0.3'
+
 from . import execution
 from . import halting
 
@@ -0,0 +1,268 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Spotify AB
+"""Benchmarks for graph loading, graph algorithms and planners.
+
+Synthetic models of a given shape and size are written in each of the
+supported file formats and timed through Graph.read, along with
+all_pairs_shortest_path, eulerize and each planner up to a fixed number
+of steps. Each case runs in a forked child, so its peak memory can be
+told apart from the others. The memory reported is the rise in peak
+resident size over what the child had before setting the case up, so
+the synthesized model held by the parent is not counted.
+
+Results are printed as one JSON object per line, for comparing across
+releases.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import graphwalker
+from graphwalker import compact
+from graphwalker import graph
+from graphwalker import gwb
+from graphwalker import halting
+from graphwalker import planning
+
+
+def chain(n, **kw):
+    """Start, then a single cycle through n vertices."""
+    verts = [('v%d' % i, 'v_%d' % i) for i in range(n)]
+    edges = [('e%d' % i, 'e_%d' % i, 'v%d' % i, 'v%d' % ((i + 1) % n))
+             for i in range(n)]
+
+    return verts, edges
+
+
+def grid(n, **kw):
+    """Start, then a torus of about n vertices with edges right and down."""
+    k = max(int(n ** 0.5), 2)
+    at = lambda x, y: 'v%d' % ((y % k) * k + (x % k))
+    verts = [(at(x, y), 'v_%d_%d' % (x, y))
+             for y in range(k) for x in range(k)]
+    edges = []
+    for y in range(k):
+        for x in range(k):
+            for dx, dy in ((1, 0), (0, 1)):
+                i = len(edges)
+                edges.append(('e%d' % i, 'e_%d' % i,
+                              at(x, y), at(x + dx, y + dy)))
+
+    return verts, edges
+
+
+def digraph(n, degree=4, seed=0, **kw):
+    """Start, then a cycle of n vertices plus random edges."""
+    rng = random.Random(seed)
+    verts, edges = chain(n)
+    for j in range(n * (degree - 1)):
+        i = len(edges)
+        edges.append(('e%d' % i, 'e_%d' % i,
+                      'v%d' % rng.randrange(n), 'v%d' % rng.randrange(n)))
+
+    return verts, edges
+
+
+def unbalanced(n, **kw):
+    """Start, then a cycle of n vertices where every other has a chord."""
+    verts, edges = chain(n)
+    for j in range(0, n - 2, 2):
+        i = len(edges)
+        edges.append(('e%d' % i, 'e_%d' % i, 'v%d' % j, 'v%d' % (j + 2)))
+
+    return verts, edges
+
+
+shapes = dict((f.__name__, f) for f in (chain, grid, digraph, unbalanced))
+
+
+def synthesize(shape, n, **kw):
+    verts, edges = shapes[shape](n, **kw)
+    verts.insert(0, ('start', 'Start'))
+    edges.append(('e_start', 'e_start', 'start', verts[1][0]))
+    return verts, edges
+
+
+def write_tgf(verts, edges):
+    return ''.join(
+        ['%s %s\n' % v for v in verts] + ['#\n'] +
+        ['%s %s %s\n' % (s, t, l) for i, l, s, t in edges])
+
+
+def write_gml(verts, edges):
+    index = dict((v[0], i) for i, v in enumerate(verts))
+    return ''.join(
+        ['graph [\n  directed 1\n'] +
+        ['  node [ id %d label "%s" ]\n' % (index[v_id], v_name)
+         for v_id, v_name in verts] +
+        ['  edge [ source %d target %d label "%s" ]\n' % (
+            index[s], index[t], l) for i, l, s, t in edges] +
+        [']\n'])
+
+
+def write_graphml(verts, edges):
+    return ''.join(
+        ['<?xml version="1.0" encoding="UTF-8"?>\n'
+         '<graphml xmlns="http://graphml.graphdrawing.org/xmlns"'
+         ' xmlns:y="http://www.yworks.com/xml/graphml">\n'
+         '<graph edgedefault="directed" id="G">\n'] +
+        ['<node id="%s"><data><y:ShapeNode>'
+         '<y:NodeLabel>%s</y:NodeLabel>'
+         '</y:ShapeNode></data></node>\n' % v for v in verts] +
+        ['<edge id="%s" source="%s" target="%s"><data><y:PolyLineEdge>'
+         '<y:EdgeLabel>%s</y:EdgeLabel>'
+         '</y:PolyLineEdge></data></edge>\n' % (i, s, t, l)
+         for i, l, s, t in edges] +
+        ['</graph>\n</graphml>\n'])
+
+
+def write_dot(verts, edges):
+    return ''.join(
+        ['digraph "G" {\n'] +
+        ['  "%s" [label="%s"];\n' % v for v in verts] +
+        ['  "%s" -> "%s" [label="%s"];\n' % (s, t, l)
+         for i, l, s, t in edges] +
+        ['}\n'])
+
+
+def write_gwb(verts, edges):
+    return gwb.pack(verts, edges)
+
+
+writers = dict((f.__name__[6:], f) for f in (
+    write_tgf, write_gml, write_graphml, write_dot, write_gwb))
+
+
+def measure(setup, run, fork=True):
+    """Time run(setup()), returning (seconds, memory in kB, error).
+
+    The memory is how far setup and run raised the peak resident size.
+    """
+    peak = lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if not fork:
+        try:
+            before = peak()
+            arg = setup()
+            t0 = time.time()
+            run(arg)
+            return time.time() - t0, peak() - before, None
+        except Exception as e:
+            return (None, None, '%s: %s' % (type(e).__name__, e))
+
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        os.write(w, json.dumps(measure(setup, run, fork=False)))
+        os._exit(0)
+
+    os.close(w)
+    data = ''
+    while True:
+        chunk = os.read(r, 4096)
+        if not chunk:
+            break
+        data += chunk
+
+    os.close(r)
+    os.waitpid(pid, 0)
+    return tuple(json.loads(data)) if data else (None, None, 'No result')
+
+
+def cases(ns, verts, edges, path):
+    """Generate (name, setup, run) triples, where run(setup()) is timed."""
+    cls = compact.CompactGraph if ns.compact else graph.Graph
+    model = lambda: cls.build(verts, edges)
+    none = lambda: None
+
+    def unstarted():
+        g = model().copy()
+        g.del_vert(g.V['start'])
+        return g
+
+    for fmt in ns.formats:
+        fn = os.path.join(path, 'model.' + fmt)
+        with open(fn, 'w') as f:
+            f.write(writers[fmt](verts, edges))
+
+        yield 'read.' + fmt, none, lambda x, fn=fn: cls.read(fn)
+
+    yield 'build', none, lambda x: model()
+    yield 'all_pairs_shortest_path', model, cls.all_pairs_shortest_path
+    yield 'eulerize', unstarted, graph.Graph.eulerize
+
+    goal = verts[-1][0]
+    for planner in sorted(planning.planners, key=lambda p: p.__name__):
+        if planner is planning.Interactive:
+            continue
+
+        args = [goal] if planner is planning.Goto else []
+
+        def run(g, planner=planner, args=args):
+            stop = halting.CountSteps(ns.steps).start(g)
+            plan = planner(*args, seed=0)(g, stop, 'Start', {})
+            for i, step in zip(xrange(ns.steps), plan):
+                pass
+
+        yield 'plan.' + planner.__name__, model, run
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    a = parser.add_argument
+
+    a('--shape', default='digraph', choices=sorted(shapes))
+    a('--size', default=1000, type=int, help="Number of vertices")
+    a('--degree', default=4, type=int, help="Mean out-degree of digraph")
+    a('--seed', default=0, type=int)
+    a('--steps', default=10000, type=int, help="Steps for each planner")
+    a('--format', dest='formats', action='append',
+      choices=sorted(writers), help="Model file formats to read")
+    a('--case', dest='cases', action='append', metavar='CASE',
+      help="Only run cases whose names start with CASE")
+    a('--compact', action='store_true',
+      help="Use the compact graph representation")
+    a('--no-fork', dest='fork', action='store_false',
+      help="Run all cases in this process")
+
+    return parser
+
+
+def main(argv, out=sys.stdout):
+    ns = arg_parser().parse_args(argv[1:])
+    ns.formats = ns.formats or sorted(writers)
+    verts, edges = synthesize(
+        ns.shape, ns.size, degree=ns.degree, seed=ns.seed)
+    path = tempfile.mkdtemp(prefix='graphwalker-bench-')
+
+    try:
+        for name, setup, run in cases(ns, verts, edges, path):
+            if ns.cases and not any(name.startswith(c) for c in ns.cases):
+                continue
+
+            seconds, rise_kb, error = measure(setup, run, ns.fork)
+            result = {
+                'case': name, 'shape': ns.shape, 'verts': len(verts),
+                'edges': len(edges), 'compact': ns.compact,
+                'seconds': seconds, 'rise_kb': rise_kb, 'error': error,
+                'version': graphwalker.__version__,
+            }
+            print >>out, json.dumps(result, sort_keys=True)
+            out.flush()
+    finally:
+        shutil.rmtree(path)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Spotify AB
+"""On-disk cache of loaded models.
+
+Entries are keyed by a hash of the command line model arguments, the
+contents of the model files, the graphwalker version and cache_format,
+so a changed file, a new release or a new pickled layout simply
+misses. An entry holds the pickled graph, including any shortest path
+data computed for it, and the actor.
+"""
+import cPickle as pickle
+import hashlib
+import logging
+import os
+import tempfile
+
+import graphwalker
+
+log = logging.getLogger(__name__)
+
+# Bump when the pickled layout of graphs or path trees changes, since the
+# package version is not always bumped along with it.
+cache_format = 2
+
+
+class ModelCache(object):
+    file = file
+
+    def __init__(self, names, path):
+        self.path = os.path.expanduser(path)
+        self.key = self.hash(names)
+        self.fn = os.path.join(self.path, self.key + '.pickle')
+
+    def hash(self, names):
+        h = hashlib.sha1('%s\0%d' % (graphwalker.__version__, cache_format))
+        for name in names:
+            h.update('\0' + name + '\0')
+            if os.path.isfile(name):
+                with self.file(name, 'rb') as f:
+                    h.update(hashlib.sha1(f.read()).hexdigest())
+
+        return h.hexdigest()
+
+    def load(self):
+        """Return the cached entry, or None if there is no valid one."""
+        try:
+            with self.file(self.fn, 'rb') as f:
+                return pickle.load(f)
+        except IOError:
+            return None
+        except Exception as e:
+            log.warning("Ignoring broken cache entry %s: %r", self.fn, e)
+            return None
+
+    def store(self, entry):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        # Write to the side and rename, so readers never see half an entry.
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        done = False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, self.fn)
+            done = True
+        finally:
+            if not done:
+                os.unlink(tmp)
@@ -13,8 +13,11 @@ initial concept.
 """
 
 import argparse
+import multiprocessing
 import time
 
+from graphwalker import cache
+from graphwalker import compact
 from graphwalker import execution
 from graphwalker import graph
 from graphwalker import planning
@@ -76,6 +79,15 @@ def arg_parser():
 
     a('--debug', action='store_true')
 
+    a('--compact', action='store_true',
+      help="Load models into the compact, read only graph representation")
+
+    a('--jobs', '-j', default=1, type=int, metavar='N',
+      help="Parse model files in N processes")
+
+    a('--cache', metavar='DIR',
+      help="Reuse loaded models, and their shortest paths, from DIR")
+
     a('--list-reporters', action=ListAction, nargs=0)
     a('--list-planners', action=ListAction, nargs=0)
     a('--list-stopcond', '--list-halter', action=ListAction, nargs=0)
@@ -88,21 +100,68 @@ def arg_parser():
     return parser
 
 
-def load_model_actor(ns):
-    model = graph.Graph.read(ns.modact[0])
-    for n in ns.modact[1:-1]:
-        model = model.combine(graph.Graph.read(n))
+def parse_model(fn):
+    """Parse a model file, in a worker process, to (verts, edges) or error."""
+    try:
+        verts, edges = graph.Graph.parse(fn)
+        return (list(verts), list(edges)), None
+    except Exception as e:
+        return None, '%s: %s' % (type(e).__name__, e)
+
 
+def parse_models(ns):
+    pool = multiprocessing.Pool(min(ns.jobs, len(ns.modact)))
     try:
-        model = model.combine(graph.Graph.read(ns.modact[-1]))
-        actor = 'graphwalker.dummy.Mute'
-    except:
+        parsed = pool.map(parse_model, ns.modact)
+    finally:
+        pool.terminate()
+
+    for fn, (ve, error) in zip(ns.modact[:-1], parsed[:-1]):
+        if error:
+            raise RuntimeError("Could not load model %s: %s" % (fn, error))
+
+    return [ve for ve, error in parsed if not error]
+
+
+def load_model_actor(ns, models_cache=None):
+    if models_cache:
+        entry = models_cache.load()
+        if entry is not None:
+            return entry
+
+    cls = compact.CompactGraph if ns.compact else graph.Graph
+
+    if ns.jobs > 1 and len(ns.modact) > 1:
+        models = [cls.build(*ve) for ve in parse_models(ns)]
         actor = ns.modact[-1]
+        if len(models) == len(ns.modact):
+            actor = 'graphwalker.dummy.Mute'
+    else:
+        models = ([cls.read(n) for n in ns.modact[:-1]] or
+                  [cls.read(ns.modact[0])])
+        try:
+            if len(ns.modact) > 1:
+                models.append(cls.read(ns.modact[-1]))
+            actor = 'graphwalker.dummy.Mute'
+        except:
+            actor = ns.modact[-1]
+
+    model = cls.merge(models) if len(models) > 1 else models[0]
+
+    if models_cache:
+        models_cache.store((model, actor))
 
     return model, actor
 
 
-def run_context(ns, model, plan, reporter, stop, executor, context, **kw):
+def path_data(model):
+    """What the model has of shortest paths, to tell if a run added any."""
+    return model.d, frozenset(model.trees)
+
+
+def run_context(ns, model, actor, plan, reporter, stop, executor, context,
+                **kw):
+    before = path_data(model)
     stop.start(model, context)
 
     path = plan(model, stop, 'Start', context)
@@ -113,6 +172,11 @@ def run_context(ns, model, plan, reporter, stop, executor, context, **kw):
 
     reporter.end_suite()
 
+    models_cache = kw.get('models_cache')
+    after = path_data(model)
+    if models_cache and (after[0] is not before[0] or after[1] - before[1]):
+        models_cache.store((model, actor))
+
 
 def build(ns):
     reporter = reporting.build(sum(ns.reporters, []))
@@ -122,7 +186,10 @@ def build(ns):
 
     stop = halting.build(ns.stop)
 
-    model, actor = load_model_actor(ns)
+    models_cache = ns.cache and cache.ModelCache(
+        ['compact'] * ns.compact + ns.modact, ns.cache)
+
+    model, actor = load_model_actor(ns, models_cache)
 
     debugger = ns.debug and ns.debugger
 
@@ -132,6 +199,7 @@ def build(ns):
         'suite': ns.suite, 'test': ns.test, 'ns': ns,
         'model': model, 'actor': actor, 'debugger': debugger, 'executor': exe,
         'plan': plan, 'stop': stop, 'reporter': reporter,
+        'models_cache': models_cache,
     }
     context['context'] = context
 
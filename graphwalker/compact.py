@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Spotify AB
+"""Compact, integer indexed graph representation.
+
+Vertices and edges are interned to dense integers, and the adjacency is
+held in CSR style arrays: the edges leaving vertex i are the edge indices
+out_edges[out_off[i]:out_off[i + 1]], and likewise for incoming edges.
+
+Vert and Edge objects are only made when someone looks them up through the
+V and E mappings, so a planner that touches a small part of a large model
+only pays for that part. CompactGraph is read only; copy() returns a plain,
+mutable Graph for planners that need to edit the model.
+"""
+from array import array
+from collections import Mapping, OrderedDict
+
+from graphwalker import graph
+
+
+class Elements(Mapping):
+    """Read only {id: Vert/Edge} mapping, making elements on demand."""
+
+    def __init__(self, ids, index, make):
+        self.ids, self.index, self.make = ids, index, make
+        self.made = {}
+
+    def __getitem__(self, key):
+        thing = self.made.get(key)
+        if thing is None:
+            thing = self.made[key] = self.make(self.index[key])
+
+        return thing
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def csr(n, keys):
+    """Group the positions of keys (each in range(n)) by key, stably."""
+    off = array('l', [0]) * (n + 1)
+    for k in keys:
+        off[k + 1] += 1
+
+    for i in xrange(n):
+        off[i + 1] += off[i]
+
+    fill = array('l', off)
+    items = array('l', [0]) * len(keys)
+    for j, k in enumerate(keys):
+        items[fill[k]] = j
+        fill[k] += 1
+
+    return off, items
+
+
+def blocked(name):
+    extra = graph.parse_name(name)[1]
+    return bool(extra and extra.get('BLOCKED'))
+
+
+class CompactGraph(graph.Graph):
+    arrays = ('vert_ids', 'vert_names', 'edge_ids', 'edge_names', 'src', 'tgt',
+              'out_off', 'out_edges', 'in_off', 'in_edges')
+
+    def __init__(self, verts=(), edges=()):
+        self.vert_ids, self.vert_names = [], []
+        self.edge_ids, self.edge_names = [], []
+        self.src, self.tgt = array('l'), array('l')
+        vert_index, edge_index = {}, {}
+
+        for v_id, v_name in verts:
+            vert_index[v_id] = len(self.vert_ids)
+            self.vert_ids.append(v_id)
+            self.vert_names.append(v_name)
+
+        for e_id, e_name, e_src, e_tgt in edges:
+            edge_index[e_id] = len(self.edge_ids)
+            self.edge_ids.append(e_id)
+            self.edge_names.append(e_name)
+            self.src.append(vert_index[e_src])
+            self.tgt.append(vert_index[e_tgt])
+
+        n = len(self.vert_ids)
+        self.out_off, self.out_edges = csr(n, self.src)
+        self.in_off, self.in_edges = csr(n, self.tgt)
+
+        self.start(vert_index, edge_index)
+
+    def start(self, vert_index, edge_index):
+        super(CompactGraph, self).__init__(
+            Elements(self.vert_ids, vert_index, self.make_vert),
+            Elements(self.edge_ids, edge_index, self.make_edge))
+        self.name_index = None
+
+    @classmethod
+    def from_image(cls, image):
+        """Make a graph using the arrays of a gwb.Image as they are."""
+        self = cls.__new__(cls)
+        for name in cls.arrays:
+            setattr(self, name, getattr(image, name))
+
+        self.start(image.vert_index, image.edge_index)
+        return self
+
+    def __getstate__(self):
+        state = super(CompactGraph, self).__getstate__()
+        state['V'], state['E'] = self.V.index, self.E.index
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.V = Elements(self.vert_ids, state['V'], self.make_vert)
+        self.E = Elements(self.edge_ids, state['E'], self.make_edge)
+
+    def make_edge(self, j):
+        return graph.Edge(self.edge_ids[j], self.edge_names[j],
+                          self.vert_ids[self.src[j]],
+                          self.vert_ids[self.tgt[j]])
+
+    def make_vert(self, i):
+        E, ids = self.E, self.edge_ids
+        outs = self.out_edges[self.out_off[i]:self.out_off[i + 1]]
+        ins = self.in_edges[self.in_off[i]:self.in_off[i + 1]]
+
+        return graph.Vert(self.vert_ids[i], self.vert_names[i],
+                          [E[ids[j]] for j in outs],
+                          [E[ids[j]] for j in ins])
+
+    def vert_by_name(self, name):
+        """Return the first vertex called name, or None.
+
+        The names are indexed from the labels, without making any Verts.
+        """
+        if self.name_index is None:
+            self.name_index = {}
+            for v_id, label in zip(self.vert_ids, self.vert_names):
+                self.name_index.setdefault(graph.parse_name(label)[0], v_id)
+
+        v_id = self.name_index.get(name)
+        return self.V[v_id] if v_id is not None else None
+
+    def vert_degrees(self):
+        I, O = {}, {}
+        for i, v_id in enumerate(self.vert_ids):
+            I[v_id] = self.in_off[i + 1] - self.in_off[i]
+            O[v_id] = self.out_off[i + 1] - self.out_off[i]
+
+        return I, O
+
+    def successors(self):
+        # Vertices are numbered in index order, as the arrays have them.
+        off, outs, tgt = self.out_off, self.out_edges, self.tgt
+        return lambda k: [tgt[j] for j in outs[off[k]:off[k + 1]]]
+
+    @classmethod
+    def merge(cls, graphs):
+        g, label = graph.Graph.merge(graphs), graph.unparse_name
+        return cls([(v.id, label(v.name, v.extra)) for v in g.V.values()],
+                   [(e.id, label(e.name, e.extra), e.src, e.tgt)
+                    for e in g.E.values()])
+
+    @classmethod
+    def read(cls, fn, **kw):
+        codec = cls.get_codec(fn)
+        if not hasattr(codec, 'Image'):
+            return super(CompactGraph, cls).read(fn, **kw)
+
+        with cls.file(fn, 'rb') as f:
+            return cls.from_image(codec.Image.open(f))
+
+    @classmethod
+    def build(cls, verts, edges):
+        V = OrderedDict((v[0], v[1]) for v in verts if not blocked(v[1]))
+        El = [e[:4] for e in edges
+              if e[2] in V and e[3] in V and not blocked(e[1])]
+
+        return cls(V.items(), El)
@@ -1,61 +1,250 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2013 Spotify AB
-import dot_parser
+"""Reader and writer for graphviz dot files.
+
+The reader handles the part of the language models use: node and edge
+statements with attribute lists, edge chains, subgraphs (whose nodes and
+edges are included), quoted strings and comments. Attribute statements
+and graph attributes are skipped. Edges of an undirected graph are added
+in both directions.
+"""
+import cStringIO
+import re
+from collections import OrderedDict
+
+space = r"""(?: \s+ | //[^\n]* | /\*.*?\*/ | ^\#[^\n]* )*"""
+
+token_pattern = re.compile(space + r"""(?:
+    (?P<string> "(?:[^"\\]|\\.)*" )
+  | (?P<html> <(?:[^<>]|<[^<>]*>)*> )
+  | (?P<op> -> | -- )
+  | (?P<id> -?(?:\.[0-9]+|[0-9]+(?:\.[0-9]*)?)(?![\w.]) | [\w\x80-\xff]+ )
+  | (?P<punct> [{}\[\]=;,:+] )
+)""", re.X | re.S | re.M)
+
+space_pattern = re.compile(space + '$', re.X | re.S | re.M)
 
 
 def unquote(s):
     return s[1:-1] if s and s[0] == s[-1] and s[0] in "\"\'" else s
 
 
+def tokenize(d):
+    """Return a list of (kind, text) tokens, dropping space and comments.
+
+    The list ends with two (None, None) tokens, for looking ahead.
+    """
+    tokens, end = [], 0
+    for mo in token_pattern.finditer(d):
+        assert mo.start() == end, 'parse error at %r' % d[end:end + 20]
+        end = mo.end()
+        kind = mo.lastgroup
+        tokens.append((kind, mo.group(kind)))
+
+    assert space_pattern.match(d, end), 'parse error at %r' % d[end:end + 20]
+    tokens.extend([(None, None)] * 2)
+    return tokens
+
+
+class Reader(object):
+    """Recursive descent parser for the tokens of one dot graph."""
+
+    def __init__(self, tokens):
+        self.tokens, self.i = tokens, 0
+        self.verts, self.edges = OrderedDict(), []
+
+    def peek(self, ahead=0):
+        return self.tokens[self.i + ahead][1]
+
+    def keyword(self):
+        """The next token in lower case, if it is a bare word."""
+        kind, text = self.tokens[self.i]
+        return text.lower() if kind == 'id' else None
+
+    def take(self, expected=None):
+        kind, text = self.tokens[self.i]
+        assert expected is None or text == expected, (
+            'parse error: expected %r, got %r' % (expected, text))
+        assert kind is not None, 'parse error: unexpected end of file'
+        self.i += 1
+        return text
+
+    def ident(self):
+        kind, text = self.tokens[self.i]
+        assert kind in ('id', 'string', 'html'), (
+            'parse error: expected an id, got %r' % text)
+        self.i += 1
+
+        if kind == 'string':
+            text = text[1:-1]
+            while self.peek() == '+':
+                self.take('+')
+                text += self.ident()
+
+        return text
+
+    def graph(self):
+        if self.keyword() == 'strict':
+            self.take()
+
+        kind = self.keyword()
+        assert kind in ('graph', 'digraph'), 'parse error: not a dot graph'
+        self.take()
+
+        if self.peek() != '{':
+            self.ident()
+
+        self.body()
+        return kind
+
+    def body(self):
+        """Read a { statement list }, returning the nodes in it."""
+        nodes = []
+        self.take('{')
+
+        while self.peek() != '}':
+            if self.peek() in (';', ','):
+                self.take()
+            else:
+                nodes.extend(self.statement())
+
+        self.take('}')
+        return nodes
+
+    def attrs(self):
+        attrs = {}
+        while self.peek() == '[':
+            self.take('[')
+            while self.peek() != ']':
+                key = self.ident()
+                if self.peek() == '=':
+                    self.take('=')
+                    attrs[key] = self.ident()
+                else:
+                    attrs[key] = 'true'
+                if self.peek() in (';', ','):
+                    self.take()
+            self.take(']')
+
+        return attrs
+
+    def endpoint(self):
+        """Read a node id or subgraph, returning the node ids in it."""
+        if self.keyword() == 'subgraph':
+            self.take()
+            if self.peek() != '{':
+                self.ident()
+
+        if self.peek() == '{':
+            return self.body()
+
+        name = self.ident()
+        while self.peek() == ':':
+            self.take(':')
+            self.ident()
+
+        self.verts.setdefault(name, name)
+        return [name]
+
+    def statement(self):
+        if self.keyword() in ('graph', 'node', 'edge'):
+            self.take()
+            self.attrs()
+            return []
+
+        if self.peek(1) == '=':
+            self.ident()
+            self.take('=')
+            self.ident()
+            return []
+
+        group, nodes = [self.endpoint()], []
+        while self.peek() in ('->', '--'):
+            self.take()
+            group.append(self.endpoint())
+
+        attrs = self.attrs()
+        label = attrs.get('label')
+
+        if len(group) == 1:
+            if label is not None:
+                for name in group[0]:
+                    self.verts[name] = label
+        else:
+            for fms, tos in zip(group, group[1:]):
+                for s in fms:
+                    for t in tos:
+                        self.edges.append((label, s, t))
+
+        for names in group:
+            nodes.extend(names)
+        return nodes
+
+
 def deserialize(d, **kw):
+    reader = Reader(tokenize(d))
+    kind = reader.graph()
 
-    seqno = (lambda q=iter(xrange(0, 2 ** 31)).next: 'e%d' % q())
+    links = reader.edges
+    if kind == 'graph':
+        # add back-edges to be equivalent to undirected graph
+        links = links + [(l, t, s) for l, s, t in links]
 
-    dot = dot_parser.parse_dot_data(d)
+    edges = [('e%d' % i, l, s, t) for i, (l, s, t) in enumerate(links)]
 
-    verts = dict((unquote(node.get_name()),
-                  unquote(node.get_label() or node.get_name()))
-                 for node in dot.get_nodes()
-                 if node.get_name() not in ('graph', 'node', 'edge'))
+    return reader.verts.items(), edges
 
-    edges = [(seqno(),
-              unquote(link.get_label()),
-              unquote(link.get_source()),
-              unquote(link.get_destination()))
-             for link in dot.get_edges()]
 
-    for i, l, s, t in edges:
-        verts.setdefault(s, s)
-        verts.setdefault(t, t)
+highattr = ',color=red,fontcolor=red,style=filled,fillcolor="#ffeeee"'
 
-    verts = verts.items()
 
-    if dot.get_graph_type() == 'graph':
-        # add back-edges to be equivalent to undirected graph
-        edges.extend([(seqno(), l, t, s) for i, l, s, t in edges])
+class Document(object):
+    """The sorted body of a dot file, made once and written many times.
 
-    return verts, edges
+    Each write patches the highlight attributes into the lines of the
+    highlighted elements and copies the rest of the body as it is.
+    """
 
+    def __init__(self, VE):
+        V, E = VE[:2]
+        lines, self.spans, end = [], {}, 0
 
-def serialize(VE, name="G", **kw):
-    highattr = ',color=red,fontcolor=red,style=filled,fillcolor="#ffeeee"'
-    highlight = kw.get('highlight') or []
-    V, E = VE[:2]
+        def add(id, line):
+            if isinstance(line, unicode):
+                line = line.encode('utf-8')
+            lines.append(line)
+            self.spans.setdefault(id, []).append((end, end + len(line)))
+            return end + len(line)
+
+        for v in sorted(V.values()):
+            end = add(v[0], "  \"%s\" [label=\"%s\"];\n" % (
+                v[0], (v[1] or '').replace('\n', ' ')))
 
-    s = "digraph \"%s\" {\n" % (name,)
+        lines.append("\n")
+        end += 1
 
-    for v in sorted(V.values()):
-        x = highattr if v[0] in highlight else ''
-        s += "  \"%s\" [label=\"%s\"%s];\n" % (
-            v[0], (v[1] or '').replace('\n', ' '), x)
+        for e in sorted(E.values()):
+            end = add(e[0], "  \"%s\" -> \"%s\" [label=\"%s\"];\n" % (
+                e[2], e[3], (e[1] or '').replace('\n', ' ')))
 
-    s += "\n"
+        self.body = ''.join(lines)
 
-    for e in sorted(E.values()):
-        x = highattr if e[0] in highlight else ''
-        s += "  \"%s\" -> \"%s\" [label=\"%s\"%s];\n" % (
-            e[2], e[3], (e[1] or '').replace('\n', ' '), x)
+    def write(self, f, name="G", highlight=(), **kw):
+        body, done = self.body, 0
+        spans = sorted(set(span for id in highlight or ()
+                           for span in self.spans.get(id, ())))
 
-    s += "}\n"
+        f.write("digraph \"%s\" {\n" % (name,))
+        for start, end in spans:
+            f.write(buffer(body, done, end - 3 - done))
+            f.write(highattr)
+            done = end - 3
 
-    return s
+        f.write(buffer(body, done))
+        f.write("}\n")
+
+
+def serialize(VE, name="G", **kw):
+    f = cStringIO.StringIO()
+    Document(VE).write(f, name, **kw)
+    return f.getvalue()
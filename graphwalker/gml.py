@@ -33,25 +33,57 @@ def check_key(s):
     return s
 
 
-def parse_value(s, ts):
-    if s == '[':
-        return parse(ts)
-    elif (s[0] + s[-1]) == '\"\"':
-        return ts, s[1:-1]
+def parse_value(s):
+    if (s[0] + s[-1]) == '\"\"':
+        return s[1:-1]
     elif '.' in s:
-        return ts, float(s)
+        return float(s)
     else:
-        return ts, int(s)
+        return int(s)
 
 
-def parse(ts):
-    d = []
-    while len(ts) > 1 and ts[0] not in ']':
-        key = check_key(ts[0])
-        ts, val = parse_value(ts[1], ts[2:])
-        d.append((key, val))
+def tokenize(d):
+    commented = re.sub("\n\\s*#[^\n]*", "\n", d)
+    for mo in re.finditer(token_pattern, commented):
+        yield mo.group(1) or mo.group(2)
+
+
+def parse(tokens):
+    """Parse tokens into nested tuples of (key, value) pairs.
+
+    Works in one pass over the tokens, keeping the lists that are still
+    open on an explicit stack, so nesting depth costs no recursion.
+    """
+    tokens = iter(tokens)
+    stack, d, keys = [], [], set()
+
+    for token in tokens:
+        if token == ']':
+            if not stack:
+                break
+            key, outer = stack.pop()
+            outer.append((key, tuple(d)))
+            d = outer
+            continue
 
-    return ts[1:], tuple(d)
+        if token not in keys:
+            keys.add(check_key(token))
+
+        key, value = token, next(tokens, None)
+        if value is None:
+            break
+        elif value == '[':
+            stack.append((key, d))
+            d = []
+        else:
+            d.append((key, parse_value(value)))
+
+    while stack:
+        key, outer = stack.pop()
+        outer.append((key, tuple(d)))
+        d = outer
+
+    return tuple(d)
 
 
 def build_vert(vl):
@@ -86,9 +118,7 @@ ID, NAME, EDGES, SRC, TGT = 0, 1, 2, 2, 3
 
 
 def deserialize(d, **kw):
-    commented = re.sub("\n\\s*#[^\n]*", "\n", d)
-    tokenized = [mo[0] or mo[1] for mo in re.findall(token_pattern, commented)]
-    empty, tree = parse(tokenized)
+    tree = parse(tokenize(d))
     serial = iter(xrange(0, 2 ** 62)).next
     verts, edges = [], []
 
@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2013 Spotify AB
-from collections import namedtuple
+import heapq
+import logging
+import time
+from array import array
+from collections import Counter, Mapping, OrderedDict, deque, namedtuple
 
 COST, PATH = 0, 1
 inf = 2 ** 31  # approximation of infinity(tm)
 
+log = logging.getLogger(__name__)
+
 VertBase = namedtuple('Vert', 'id name outgoing incoming extra')
 EdgeBase = namedtuple('Edge', 'id name src tgt extra')
 
@@ -25,6 +31,17 @@ def parse_name(name, extra=None):
     return name, extra
 
 
+def unparse_name(name, extra=None):
+    """Return a label that parse_name would split into name and extra."""
+    if not extra:
+        return name
+
+    return '\n'.join(
+        [name or ''] +
+        [k if v is True else '%s=%s' % (k, v)
+         for k, v in sorted(extra.items())])
+
+
 def merge_extras(left, right):
     if left is None:
         return right
@@ -38,10 +55,33 @@ def merge_extras(left, right):
         return new_extra
 
 
+# Extra attributes common enough to be kept as plain instance attributes,
+# defaulting to None on the class, so looking them up skips __getattr__.
+slots = ('weight', 'BLOCKED', 'cost')
+
+
+def fill_slots(thing):
+    extra = thing.extra
+    if extra:
+        attrs = thing.__dict__
+        for key in slots:
+            if key in extra:
+                attrs[key] = extra[key]
+
+    return thing
+
+
 class Edge(EdgeBase):
+    weight = BLOCKED = cost = None
+
     def __new__(cls, id, name, src, tgt, extra=None):
         name, extra = parse_name(name, extra)
-        return tuple.__new__(cls, (id, name, src, tgt, extra))
+        return fill_slots(tuple.__new__(cls, (id, name, src, tgt, extra)))
+
+    @classmethod
+    def _make(cls, iterable):
+        """Make an Edge of already parsed fields, as _replace does."""
+        return fill_slots(tuple.__new__(cls, iterable))
 
     def __str__(self):
         return 'e(%s/%s %s->%s)' % self[:4]
@@ -63,6 +103,8 @@ class Edge(EdgeBase):
 
 
 class Vert(VertBase):
+    weight = BLOCKED = cost = None
+
     def __new__(cls, id, name, outgoing, incoming, extra=None):
         name, extra = parse_name(name, extra)
         outs, ins = tuple(outgoing), tuple(incoming)
@@ -70,7 +112,12 @@ class Vert(VertBase):
         if not all(isinstance(e, Edge) for e in outs + ins):
             raise TypeError("Only edges permitted in edge lists")
 
-        return tuple.__new__(cls, (id, name, outs, ins, extra))
+        return fill_slots(tuple.__new__(cls, (id, name, outs, ins, extra)))
+
+    @classmethod
+    def _make(cls, iterable):
+        """Make a Vert of already parsed and checked fields."""
+        return fill_slots(tuple.__new__(cls, iterable))
 
     def __str__(self):
         return 'v(%s/%s)' % (self[0], self[1])
@@ -79,10 +126,9 @@ class Vert(VertBase):
         return self.extra.get(key) if self.extra else None
 
     def without_edge_by_id(self, e_id):
-        return Vert(self.id, self.name,
-                    [e for e in self.outgoing if e.id != e_id],
-                    [e for e in self.incoming if e.id != e_id],
-                    self.extra)
+        return self._replace(
+            outgoing=tuple(e for e in self.outgoing if e.id != e_id),
+            incoming=tuple(e for e in self.incoming if e.id != e_id))
 
     def combine(self, other):
         if other is None or self == other:
@@ -104,18 +150,423 @@ class Vert(VertBase):
         return Vert(self.id, self.name, new_outgoing, new_incoming, new_extra)
 
 
+class Numbering(object):
+    """Dense numbers for vertex ids, to index arrays by.
+
+    Numbers are only ever added, so arrays made earlier stay valid for the
+    vertices they cover; a deleted vertex keeps its number.
+    """
+
+    def __init__(self, ids=()):
+        self.ids, self.index = [], {}
+        for v_id in ids:
+            self.add(v_id)
+
+    def add(self, v_id):
+        k = self.index.get(v_id)
+        if k is None:
+            k = self.index[v_id] = len(self.ids)
+            self.ids.append(v_id)
+
+        return k
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Distances(Mapping):
+    """{id: cost} view of the vertices a PathTree reaches."""
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    def __getitem__(self, v_id):
+        cost = self.tree.cost_of(v_id)
+        if cost is None:
+            raise KeyError(v_id)
+
+        return cost
+
+    def __iter__(self):
+        ids = self.tree.numbers.ids
+        return (ids[k] for k, c in enumerate(self.tree.cost) if c >= 0)
+
+    def __len__(self):
+        return len(self.tree.cost) - self.tree.cost.count(-1)
+
+
+class PathTree(object):
+    """Shortest paths from a single source, kept as predecessor arrays.
+
+    cost[k] and prev[k] are the distance to the vertex numbered k by
+    numbers and the number of the vertex before it, or -1 if it is not
+    reached. Every edge costs one, so a breadth first search gives the
+    distances. Paths are rebuilt from the predecessors only when asked
+    for.
+
+    A tree can be repaired in place after an edge is added or deleted, at
+    a cost in the size of the part of the tree that changes. Only the
+    graph named as owner may do so; trees shared between copies of a
+    graph have no owner and are copied first.
+    """
+    owner = None
+
+    def __init__(self, src, cost, prev, numbers, owner=None):
+        self.src, self.cost, self.prev = src, cost, prev
+        self.numbers, self.owner = numbers, owner
+
+    def copy(self, owner=None):
+        return PathTree(self.src, array('i', self.cost), array('i', self.prev),
+                        self.numbers, owner)
+
+    @property
+    def dist(self):
+        return Distances(self)
+
+    def cost_of(self, v_id):
+        k = self.numbers.index.get(v_id)
+        if k is None or k >= len(self.cost) or self.cost[k] < 0:
+            return None
+
+        return self.cost[k]
+
+    def fit(self):
+        """Grow the arrays over vertices numbered since they were made."""
+        n = len(self.numbers) - len(self.cost)
+        if n > 0:
+            self.cost.extend(array('i', [-1]) * n)
+            self.prev.extend(array('i', [-1]) * n)
+
+    def stale(self, V, fm, to):
+        """True if the edge fm -> to changes the tree.
+
+        The edge has just been added to or deleted from V.
+        """
+        i, j = self.numbers.add(fm), self.numbers.add(to)
+        self.fit()
+        cost = self.cost
+
+        if fm == to or cost[i] < 0:
+            return False
+        elif cost[j] < 0 or cost[i] + 1 < cost[j]:
+            return True
+        else:
+            return (self.prev[j] == i and
+                    not any(e.tgt == to for e in V[fm].outgoing))
+
+    def repair(self, V, fm, to):
+        """Update a stale tree for the edge fm -> to."""
+        i, j = self.numbers.index[fm], self.numbers.index[to]
+        if self.cost[j] < 0 or self.cost[i] + 1 < self.cost[j]:
+            self.inserted(V, i, j)
+        else:
+            self.deleted(V, j)
+
+    def inserted(self, V, i, j):
+        cost, prev = self.cost, self.prev
+        ids, index = self.numbers.ids, self.numbers.index
+        cost[j], prev[j] = cost[i] + 1, i
+        queue = deque([j])
+
+        while queue:
+            k = queue.popleft()
+            c = cost[k] + 1
+            for e in V[ids[k]].outgoing:
+                t = index[e.tgt]
+                if cost[t] < 0 or c < cost[t]:
+                    cost[t], prev[t] = c, k
+                    queue.append(t)
+
+    def deleted(self, V, j):
+        cost, prev = self.cost, self.prev
+        ids, index = self.numbers.ids, self.numbers.index
+
+        # Everything below j in the tree has lost its path...
+        lost, stack = set([j]), [j]
+        while stack:
+            k = stack.pop()
+            for e in V[ids[k]].outgoing:
+                t = index[e.tgt]
+                if t not in lost and prev[t] == k:
+                    lost.add(t)
+                    stack.append(t)
+
+        for k in lost:
+            cost[k] = prev[k] = -1
+
+        # ...and is hung back on by its best remaining edges from outside.
+        heap = []
+        for k in lost:
+            for e in V[ids[k]].incoming:
+                f = index[e.src]
+                if cost[f] >= 0:
+                    heap.append((cost[f] + 1, k, f))
+
+        heapq.heapify(heap)
+        while heap:
+            c, k, f = heapq.heappop(heap)
+            if cost[k] >= 0:
+                continue
+
+            cost[k], prev[k] = c, f
+            for e in V[ids[k]].outgoing:
+                t = index[e.tgt]
+                if t in lost and cost[t] < 0:
+                    heapq.heappush(heap, (c + 1, t, k))
+
+    @classmethod
+    def search(cls, numbers, out, src):
+        """Make the tree of shortest paths from src.
+
+        out(k) gives the numbers of the vertices that the edges from
+        vertex number k lead to.
+        """
+        cost = array('i', [-1]) * len(numbers)
+        prev = array('i', [-1]) * len(numbers)
+        s = numbers.index[src]
+        cost[s], frontier, c = 0, [s], 0
+
+        while frontier:
+            reached, c = [], c + 1
+            for k in frontier:
+                for t in out(k):
+                    if cost[t] < 0:
+                        cost[t], prev[t] = c, k
+                        reached.append(t)
+
+            frontier = reached
+
+        return cls(src, cost, prev, numbers)
+
+    def path(self, to):
+        if self.cost_of(to) is None:
+            return None
+
+        ids, prev = self.numbers.ids, self.prev
+        k, s, path = self.numbers.index[to], self.numbers.index[self.src], []
+        while k != s:
+            path.append(ids[k])
+            k = prev[k]
+
+        return tuple(reversed(path))
+
+    def __getitem__(self, to):
+        cost = self.cost_of(to)
+        if cost is None:
+            return inf, None
+
+        return cost, self.path(to)
+
+
+class ShortestPaths(Mapping):
+    """All pairs shortest paths as a {(fm, to): (cost, path)} mapping.
+
+    Holds one PathTree per source vertex, so storage is two integers per
+    pair rather than in the total length of paths.
+    """
+
+    def __init__(self, trees):
+        self.trees = trees
+
+    def __getitem__(self, key):
+        fm, to = key
+        if to not in self.trees:
+            raise KeyError(key)
+
+        return self.trees[fm][to]
+
+    def __iter__(self):
+        for fm in self.trees:
+            for to in self.trees:
+                yield fm, to
+
+    def __len__(self):
+        return len(self.trees) ** 2
+
+
+class Components(object):
+    """Strongly connected components, and reachability between them.
+
+    Components are numbered in the order Tarjan's algorithm completes them,
+    which is reverse topological: every edge between two components goes
+    from the higher number to the lower. The components reachable from a
+    component are found by a search of the condensation the first time
+    they are asked for, and kept.
+    """
+
+    def __init__(self, V):
+        index, low, stack = {}, {}, []
+        self.comp, self.members = {}, []
+
+        for root in V:
+            if root in index:
+                continue
+
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            work = [(root, iter(V[root].outgoing))]
+
+            while work:
+                v_id, edges = work[-1]
+                for edge in edges:
+                    w = edge.tgt
+                    if w not in index:
+                        index[w] = low[w] = len(index)
+                        stack.append(w)
+                        work.append((w, iter(V[w].outgoing)))
+                        break
+                    elif w not in self.comp:  # still on the stack
+                        low[v_id] = min(low[v_id], index[w])
+                else:
+                    work.pop()
+                    if work:
+                        u = work[-1][0]
+                        low[u] = min(low[u], low[v_id])
+
+                    if low[v_id] == index[v_id]:
+                        c, members = len(self.members), []
+                        while not members or members[-1] != v_id:
+                            members.append(stack.pop())
+                            self.comp[members[-1]] = c
+                        self.members.append(members)
+
+        self.succ = [set() for c in self.members]
+        for c, members in enumerate(self.members):
+            for v_id in members:
+                for edge in V[v_id].outgoing:
+                    if self.comp[edge.tgt] != c:
+                        self.succ[c].add(self.comp[edge.tgt])
+
+        self.sinks = [c for c, succ in enumerate(self.succ) if not succ]
+        self.reached = {}
+
+    def reach(self, c):
+        """Return the set of components reachable from component c."""
+        reached = self.reached.get(c)
+        if reached is None:
+            reached, frontier = set([c]), [c]
+            while frontier:
+                k = frontier.pop()
+                for j in self.succ[k]:
+                    if j not in reached:
+                        reached.add(j)
+                        frontier.append(j)
+
+            self.reached[c] = reached
+
+        return reached
+
+    def reaches(self, fm, to):
+        return self.comp[to] in self.reach(self.comp[fm])
+
+    def is_stuck(self, v_id):
+        """True if no other vertex can be reached from v_id."""
+        c = self.comp[v_id]
+        return not self.succ[c] and len(self.members[c]) == 1
+
+
+def min_cost_flow(V, excess, deficit):
+    """Route unit cost flow from excess to deficit vertices at least cost.
+
+    Uses successive shortest paths with Dijkstra on reduced costs, from a
+    super source feeding every vertex with excess to a super sink drained
+    by every vertex with deficit. Returns {(fm, to): count} of the edges
+    the flow runs along.
+    """
+    excess, deficit = dict(excess), dict(deficit)
+    S, T = object(), object()
+    pi, flow, back = {}, {}, {}  # back: {to: {fm: count}}, reverse residuals
+    seq = iter(xrange(0, inf)).next
+
+    while excess:
+        pi_s = pi.get(S, 0)
+        dist, pred = {S: 0}, {S: None}
+        heap = [(pi_s - pi.get(v, 0), seq(), v, S, 0) for v in excess]
+        heapq.heapify(heap)
+
+        while heap:
+            c, _, u, fm, sign = heapq.heappop(heap)
+            if u in dist:
+                continue
+
+            dist[u], pred[u] = c, (fm, sign)
+            if u is T:
+                break
+
+            c += pi.get(u, 0)
+            if u in deficit:
+                heapq.heappush(heap, (c - pi.get(T, 0), seq(), T, u, 0))
+
+            for e in V[u].outgoing:
+                if e.tgt not in dist:
+                    heapq.heappush(
+                        heap, (c + 1 - pi.get(e.tgt, 0), seq(), e.tgt, u, 1))
+
+            for v in back.get(u, ()):
+                if v not in dist:
+                    heapq.heappush(
+                        heap, (c - 1 - pi.get(v, 0), seq(), v, u, -1))
+        else:
+            assert False, "Graph has sinks and cannot be made eulerian"
+
+        for v in dist:
+            pi[v] = pi.get(v, 0) + dist[v] - dist[T]
+
+        path, v = [], pred[T][0]
+        end = v
+        while pred[v][0] is not S:
+            u, sign = pred[v]
+            path.append((u, v, sign))
+            v = u
+
+        start = v
+        n = min([excess[start], deficit[end]] +
+                [back[u][v] for u, v, sign in path if sign < 0])
+
+        for u, v, sign in path:
+            if sign > 0:
+                flow[(u, v)] = flow.get((u, v), 0) + n
+                back.setdefault(v, {})[u] = back.get(v, {}).get(u, 0) + n
+            else:
+                flow[(v, u)] -= n
+                back[u][v] -= n
+                if not back[u][v]:
+                    del back[u][v], flow[(v, u)]
+
+        for counts, v in ((excess, start), (deficit, end)):
+            counts[v] -= n
+            if not counts[v]:
+                del counts[v]
+
+    return flow
+
+
 class Graph(object):
     vert_cls, edge_cls = Vert, Edge
     sentinel = []
+    clock = staticmethod(time.time)
+    trees_kept = 256  # source trees kept by paths_from, least recent first
 
     def __init__(self, V=None, E=None, d=None):
         self.V = (V if V is not None else {})
         self.E = (E if E is not None else {})
         self.d = d
+        self.trees = OrderedDict()
+        self.degrees = None
+        self.scc = None
+        self.stats = {}
+        self.version = 0  # bumped by the editing methods
+        self.document = None
+        self.numbering = None
 
     def __eq__(self, other):
         return self.V == other.V and self.E == other.E
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['document'] = None
+        return state
+
     def sanity_check(self):
         for e_id, edge in self.E.items():
             assert isinstance(edge, Edge)
@@ -145,11 +596,94 @@ class Graph(object):
 
         return Graph(new_V, new_E)
 
+    @classmethod
+    def merge(cls, graphs):
+        """Combine any number of graphs at once, as by repeated combine.
+
+        Vertices and edges are indexed by id in a single pass, checking for
+        conflicts on the way, so this is linear in the total size, but for
+        copying the dicts once per graph. combine does that too, and dict
+        order depends on it. As with combine, the edges of a vertex in a
+        later graph come first, followed by those of earlier graphs that
+        the later ones do not have.
+        """
+        V, E, outgoing, incoming = {}, {}, {}, {}
+
+        for i, g in enumerate(graphs):
+            V, E = (dict(V), dict(E)) if i else (dict(g.V), dict(g.E))
+
+            for e_id, edge in g.E.items():
+                if e_id not in E:
+                    E[e_id] = edge
+                else:
+                    assert edge == E[e_id], 'Edge mismatch in combined graphs'
+
+            for v_id, vert in g.V.items():
+                old = V.get(v_id)
+                if v_id not in outgoing:
+                    V[v_id] = vert
+                    outgoing[v_id], incoming[v_id] = [], []
+                elif old != vert:
+                    assert old.name == vert.name, (
+                        'Name mismatch in combined vertices')
+                    V[v_id] = vert._replace(
+                        extra=merge_extras(vert.extra, old.extra))
+
+                outgoing[v_id].append([e.id for e in vert.outgoing])
+                incoming[v_id].append([e.id for e in vert.incoming])
+
+        def later_first(lists):
+            ids, seen = [], set()
+            for l in reversed(lists):
+                ids.extend(e_id for e_id in l if e_id not in seen)
+                seen.update(l)
+
+            return tuple(E[e_id] for e_id in ids)
+
+        for v_id, vert in V.items():
+            V[v_id] = vert._replace(
+                outgoing=later_first(outgoing[v_id]),
+                incoming=later_first(incoming[v_id]))
+
+        return Graph(V, E)
+
     def copy(self):
-        return Graph(dict(self.V), dict(self.E), self.d)
+        d = ShortestPaths(dict(self.d.trees)) if self.d is not None else None
+        g = Graph(dict(self.V), dict(self.E), d)
+        g.trees.update(self.trees)
+        if self.degrees is not None:
+            g.degrees = tuple(dict(x) for x in self.degrees)
+        g.scc = self.scc
+        g.numbering = self.numbering
+
+        # The trees are shared now, so neither graph may repair them in place.
+        for trees in self.tree_dicts():
+            for tree in trees.values():
+                tree.owner = None
+
+        return g
 
     def changed(self):
         self.d = None
+        self.trees.clear()
+        self.scc = None
+
+    def tree_dicts(self):
+        return [self.trees] + ([self.d.trees] if self.d is not None else [])
+
+    def repaired(self, fm, to):
+        """Update kept shortest paths after adding or deleting edge fm -> to.
+
+        Each kept tree is checked in constant time, and only the trees the
+        edge changes are repaired, by redoing the part below the edge.
+        """
+        self.scc = None
+        for trees in self.tree_dicts():
+            for src, tree in trees.items():
+                if tree.stale(self.V, fm, to):
+                    if tree.owner is not self:
+                        tree = trees[src] = tree.copy(self)
+                    tree.repair(self.V, fm, to)
 
     def new_edge_id(self):
         for i in xrange(getattr(self, '_edge_id', 0), inf):
@@ -165,13 +699,49 @@ class Graph(object):
                 self._vert_id = i
                 return new_id
 
-    def replace_vert(self, vert):
+    def _set_vert(self, vert):
         self.V[vert.id] = vert
-        self.changed()
+        self.version += 1
+        if self.numbering is not None:
+            self.numbering.add(vert.id)
+
+        if self.degrees is not None:
+            I, O = self.degrees
+            I[vert.id], O[vert.id] = len(vert.incoming), len(vert.outgoing)
+
+    def replace_vert(self, vert):
+        old = self.V.get(vert.id)
+        if old is None:
+            self._set_vert(vert)
+            self.changed()
+            return
+
+        # Repair for one edge at a time, deletions first.
+        was, now = old.outgoing + old.incoming, vert.outgoing + vert.incoming
+        for e in was:
+            if e not in now:
+                old = old.without_edge_by_id(e.id)
+                self._set_vert(old)
+                self.repaired(e.src, e.tgt)
+
+        self._set_vert(vert)
+        for e in now:
+            if e not in was:
+                self.repaired(e.src, e.tgt)
+
+        self.scc = None
 
     def add_vert(self, id, name=None):
-        self.V[id] = vert = Vert(id, name if name is not None else id, (), ())
-        self.changed()
+        vert = Vert(id, name if name is not None else id, (), ())
+        if id in self.V:
+            self.changed()
+        elif self.d is not None:
+            self.numbers().add(id)
+            tree = PathTree.search(self.numbers(), lambda k: (), id)
+            tree.owner, self.d.trees[id] = self, tree
+
+        self._set_vert(vert)
+        self.scc = None
 
         return vert
 
@@ -180,92 +750,164 @@ class Graph(object):
         e_name = e_name if e_name is self.sentinel else e_name
 
         self.E[e_id] = edge = Edge(e_id, e_name, src.id, tgt.id)
-        self.replace_vert(src._replace(outgoing=src.outgoing + (edge,)))
-        self.replace_vert(tgt._replace(incoming=tgt.incoming + (edge,)))
-        self.changed()
+        self._set_vert(src._replace(outgoing=src.outgoing + (edge,)))
+        self._set_vert(tgt._replace(incoming=tgt.incoming + (edge,)))
+        self.repaired(src.id, tgt.id)
 
         return edge
 
     def del_edge(self, edge):
-        self.replace_vert(self.V[edge.src].without_edge_by_id(edge.id))
-        self.replace_vert(self.V[edge.tgt].without_edge_by_id(edge.id))
+        self._set_vert(self.V[edge.src].without_edge_by_id(edge.id))
+        self._set_vert(self.V[edge.tgt].without_edge_by_id(edge.id))
         del self.E[edge.id]
-        self.changed()
+        self.repaired(edge.src, edge.tgt)
 
     def del_vert(self, vert):
         v_id = vert.id
+        vert = self.V[v_id]
 
-        for e_id, edge in self.E.items():
-            if v_id == edge.src or v_id == edge.tgt:
+        for trees in self.tree_dicts():
+            trees.pop(v_id, None)
+
+        for edge in vert.outgoing + vert.incoming:
+            if edge.id in self.E:
                 self.del_edge(edge)
 
         del self.V[v_id]
-        self.changed()
+        self.version += 1
+        if self.degrees is not None:
+            for x in self.degrees:
+                del x[v_id]
+
+        self.scc = None
 
     def copy_edge(self, edge):
         new = edge.clone(self.new_edge_id())
         src, tgt = self.V[edge.src], self.V[edge.tgt]
 
-        self.replace_vert(src._replace(outgoing=src.outgoing + (new,)))
-        self.replace_vert(tgt._replace(incoming=tgt.incoming + (new,)))
+        self._set_vert(src._replace(outgoing=src.outgoing + (new,)))
+        self._set_vert(tgt._replace(incoming=tgt.incoming + (new,)))
         self.E[new.id] = new
 
         return edge
 
+    def vert_by_name(self, name):
+        """Return the first vertex called name, or None."""
+        for vert in self.V.values():
+            if vert.name == name:
+                return vert
+
+        return None
+
     def vert_degrees(self):
-        return (
-            dict((v.id, len(v.incoming)) for v in self.V.values()),
-            dict((v.id, len(v.outgoing)) for v in self.V.values()))
+        """Return ({id: in-degree}, {id: out-degree}) for all vertices.
+
+        The dicts are computed once and then kept up to date by the
+        editing methods of the graph, so they must not be modified.
+        """
+        if self.degrees is None:
+            self.degrees = (
+                dict((v.id, len(v.incoming)) for v in self.V.values()),
+                dict((v.id, len(v.outgoing)) for v in self.V.values()))
+
+        return self.degrees
 
     def odd_verts(self):
         I, O = self.vert_degrees()
 
         # innie =def= more incoming than outgoing edges.
         # outie =def= more outgoing than incoming edges.
-        innies = sum([[v] * (I[v] - O[v]) for v in I if I[v] > O[v]], [])
-        outies = sum([[v] * (O[v] - I[v]) for v in I if O[v] > I[v]], [])
+        innies, outies = [], []
+        for v in I:
+            excess = I[v] - O[v]
+            if excess > 0:
+                innies.extend([v] * excess)
+            elif excess < 0:
+                outies.extend([v] * -excess)
 
         return innies, outies
 
     def all_pairs_shortest_path(self):
         d = getattr(self, 'd', None)
-        if d:
+        if d is not None:
             return d
 
-        vert_ids = self.V.keys()
-        dist = {}
+        out = self.successors()
+        out = [out(k) for k in xrange(len(self.numbers()))].__getitem__
+        self.d = d = ShortestPaths(
+            dict((v_id, self.search(v_id, out)) for v_id in self.V))
+        for tree in d.trees.values():
+            tree.owner = self
 
-        for i in vert_ids:
-            for j in vert_ids:
-                if i == j:
-                    dist[(i, j)] = (0, ())
-                else:
-                    for e in self.V[i].outgoing:
-                        if e.tgt == j:
-                            dist[(i, j)] = (1, (j,))
-                            break
-                    else:
-                        dist[(i, j)] = (inf, None)
-
-        for k in vert_ids:
-            for i in vert_ids:
-                for j in vert_ids:
-                    alt_cost = dist[(i, k)][COST] + dist[(k, j)][COST]
-                    cost = dist[(i, j)][COST]
-                    if cost > alt_cost:
-                        alt_path = dist[(i, k)][PATH] + dist[(k, j)][PATH]
-                        dist[(i, j)] = (alt_cost, alt_path)
-
-        self.d = dist
-        return dist
+        return d
 
-    def is_stuck(self, vert):
-        d = self.all_pairs_shortest_path()
-        for (fm, to), (cost, path) in d.items():
-            if fm == vert.id and to != vert.id and cost < inf:
-                return False
+    def numbers(self):
+        """Return the Numbering of the vertices that PathTrees use."""
+        if self.numbering is None:
+            self.numbering = Numbering(self.V)
 
-        return True
+        return self.numbering
+
+    def successors(self):
+        """Return a function from a vertex number to its successors.
+
+        The successors are the numbers of the vertices its edges lead to.
+        """
+        V, ids, index = self.V, self.numbers().ids, self.numbers().index
+
+        def out(k):
+            vert = V.get(ids[k])
+            return [index[e.tgt] for e in vert.outgoing] if vert else ()
+
+        return out
+
+    def search(self, v_id, out=None):
+        return PathTree.search(self.numbers(), out or self.successors(), v_id)
+
+    def paths_from(self, v_id):
+        """Return the PathTree of shortest paths from the vertex v_id.
+
+        Trees are searched for on demand and the most recently used ones
+        are kept, up to trees_kept of them.
+        """
+        if self.d is not None:
+            return self.d.trees[v_id]
+
+        tree = self.trees.pop(v_id, None)
+        if tree is None:
+            tree = self.search(v_id)
+            tree.owner = self
+            while len(self.trees) >= max(self.trees_kept, 1):
+                self.trees.popitem(last=False)
+
+        self.trees[v_id] = tree
+        return tree
+
+    def components(self):
+        """Return the strongly connected Components of the graph.
+
+        They are found once and kept until the graph is changed. Sink
+        components, that a walk can never leave, are logged when there
+        is more than one, since a walk can then only cover one of them.
+        """
+        if self.scc is None:
+            self.scc = scc = Components(self.V)
+            if len(scc.sinks) > 1:
+                log.warning(
+                    "Graph has %d sink components, which can never be left: "
+                    "%s", len(scc.sinks), ', '.join(
+                        '{%s}' % ', '.join(sorted(scc.members[c])[:3] +
+                                           ['...'] * (len(scc.members[c]) > 3))
+                        for c in scc.sinks))
+
+        return self.scc
+
+    def reaches(self, fm, to):
+        """True if there is a path from vertex id fm to vertex id to."""
+        return self.components().reaches(fm, to)
+
+    def is_stuck(self, vert):
+        return self.components().is_stuck(vert.id)
 
     def duplicate_edge_by_ids(self, fm, to):
         for e in self.V[fm].outgoing:
@@ -276,34 +918,30 @@ class Graph(object):
             raise RuntimeError("Attempt to duplicate non-existing edge")
 
     def eulerize(self):
+        """Duplicate edges to make the graph Eulerian, adding as few as can be.
+
+        Every innie must be joined to an outie by a duplicated path. The
+        cheapest such pairing is a minimum cost flow from innies to outies,
+        which is the directed Chinese Postman problem. The number of added
+        edges and the time taken are kept in stats['eulerize'].
+        """
+        t0 = self.clock()
         innies, outies = self.odd_verts()
 
-        if len(innies) == 0:
-            return
+        flow = {}
+        if innies:
+            flow = min_cost_flow(self.V, Counter(innies), Counter(outies))
 
-        # http://www.geocities.com/model_based_testing/model-based.htm
-        # 1. find minimum pairing of innies and outies.
-        # 2. lay down extra paths using path info in dists
-        # 3. new graph is now g'teed eulerian
-
-        self.dist = d = self.all_pairs_shortest_path()
-
-        tries = sorted((cost, fm, to, path)
-                       for (fm, to), (cost, path) in d.items()
-                       if cost < inf and fm in innies and to in outies)
-
-        while len(innies):
-            for cost, fm, to, path in tries:
-                if fm in innies and to in outies:
-                    outies.remove(to)
-                    innies.remove(fm)
-                    a = fm
-                    for b in path:
-                        self.duplicate_edge_by_ids(a, b)
-                        a = b
-                    break
-            else:
-                assert False, "Graph has sinks and cannot be made eulerian"
+        for (fm, to), n in flow.items():
+            for i in xrange(n):
+                self.duplicate_edge_by_ids(fm, to)
+
+        self.stats['eulerize'] = stats = {
+            'duplicated': sum(flow.values()),
+            'seconds': self.clock() - t0,
+        }
+        log.info("Eulerized by duplicating %(duplicated)d edges "
+                 "in %(seconds).3fs", stats)
 
     file = file
 
@@ -314,28 +952,69 @@ class Graph(object):
 
     @classmethod
     def build(cls, verts, edges):
-        El = [Edge(*e) for e in edges]
-        Vl = [Vert(v[0], v[1],
-                   [e for e in El if e.src == v[0]],
-                   [e for e in El if e.tgt == v[0]])
-              for v in verts]
-
+        Vl = [Vert(v[0], v[1], (), ()) for v in verts]
         V = dict((v.id, v) for v in Vl if not v.BLOCKED)
-        E = dict((e.id, e) for e in El
-                 if (e.tgt in V) and (e.src in V) and not e.BLOCKED)
+        E, outgoing, incoming = {}, {}, {}
+
+        for e in edges:
+            e = Edge(*e)
+            if e.src in V and e.tgt in V and not e.BLOCKED:
+                E[e.id] = e
+                outgoing.setdefault(e.src, []).append(e)
+                incoming.setdefault(e.tgt, []).append(e)
+
+        for v_id, v in V.items():
+            V[v_id] = v._replace(outgoing=tuple(outgoing.get(v_id, ())),
+                                 incoming=tuple(incoming.get(v_id, ())))
 
         return cls(V, E)
 
+    @classmethod
+    def open_for(cls, codec, fn, mode):
+        """Open fn in mode, in binary if the codec says its format is."""
+        if getattr(codec, 'binary', False):
+            return cls.file(fn, mode + 'b')
+
+        return cls.file(fn) if mode == 'r' else cls.file(fn, mode)
+
+    @classmethod
+    def parse(cls, fn, **kw):
+        """Read the file fn into the (verts, edges) its codec gives.
+
+        Codecs with a deserialize_file function read from the open file
+        themselves, so they need not hold all of it at once.
+        """
+        codec = cls.get_codec(fn)
+        with cls.open_for(codec, fn, 'r') as f:
+            if hasattr(codec, 'deserialize_file'):
+                return codec.deserialize_file(f, **kw)
+
+            return codec.deserialize(f.read(), **kw)
+
     @classmethod
     def read(cls, fn, **kw):
-        with cls.file(fn) as f:
-            verts, edges = cls.get_codec(fn).deserialize(f.read(), **kw)
-            return cls.build(verts, edges)
+        verts, edges = cls.parse(fn, **kw)
+        return cls.build(verts, edges)
 
     def serialize(self, fn, **kw):
         codec = self.get_codec(fn)
         return codec.serialize((self.V, self.E), fn.split('.', 1)[0], **kw)
 
     def write(self, fn, **kw):
-        with self.file(fn, 'w') as f:
-            f.write(self.serialize(fn, **kw))
+        """Write the graph to the file fn, in the format of its suffix.
+
+        Codecs with a Document class are asked for one only when the graph
+        has changed since the last write, and it writes to the file itself.
+        """
+        codec = self.get_codec(fn)
+        with self.open_for(codec, fn, 'w') as f:
+            if not hasattr(codec, 'Document'):
+                f.write(self.serialize(fn, **kw))
+                return
+
+            if self.document is None or self.document[:2] != (
+                    codec, self.version):
+                self.document = (
+                    codec, self.version, codec.Document((self.V, self.E)))
+
+            self.document[2].write(f, fn.split('.', 1)[0], **kw)
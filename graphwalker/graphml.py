@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2013 Spotify AB
-import xml.etree.ElementTree as ET
+import cStringIO
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
 
 y = '{http://www.yworks.com/xml/graphml}'
 ns = '{http://graphml.graphdrawing.org/xmlns}'
@@ -8,23 +13,51 @@ nodestr = './/' + ns + 'node'
 edgestr = './/' + ns + 'edge'
 
 
-def deserialize(d, **kw):
-    doc = ET.fromstring(d)
+def deserialize_file(f, **kw):
+    """Read verts and edges from the file f in one streaming pass.
+
+    Every element is dropped from the tree as soon as it ends, so only the
+    currently open elements are held, however much styling data there is.
+    A node or edge is labeled by the first label found inside it.
+    """
     verts, edges = [], []
+    open_elements, nodes, edge = [], [], None
 
-    for n in doc.findall('.//' + ns + 'node'):
-        l = n.find('.//' + y + 'NodeLabel')
-        if l is None:
+    for event, el in ET.iterparse(f, events=('start', 'end')):
+        if event == 'start':
+            if el.tag == ns + 'node':
+                nodes.append([el.get('id'), None])
+                verts.append(nodes[-1])
+            elif el.tag == ns + 'edge':
+                edge = [el.get('id'), None, el.get('source'), el.get('target')]
+
+            open_elements.append(el)
             continue
 
-        verts.append((n.attrib['id'], l.text.strip()))
+        open_elements.pop()
+        if open_elements:
+            open_elements[-1].remove(el)
+
+        if el.tag == y + 'NodeLabel':
+            for node in nodes:
+                if node[1] is None:
+                    node[1] = (el.text or '').strip()
+
+        elif el.tag == y + 'EdgeLabel':
+            if edge is not None and edge[1] is None:
+                edge[1] = (el.text or '').strip()
 
-    for n in doc.findall('.//' + ns + 'edge'):
-        l = n.find('.//' + y + 'EdgeLabel')
-        e_id = n.attrib['id']
-        e_name = l.text.strip() if l is not None else None
-        e_src = n.attrib['source']
-        e_tgt = n.attrib['target']
-        edges.append((e_id, e_name, e_src, e_tgt))
+        elif el.tag == ns + 'node':
+            nodes.pop()
 
-    return verts, edges
+        elif el.tag == ns + 'edge':
+            edges.append(tuple(edge))
+            edge = None
+
+        el.clear()
+
+    return [tuple(v) for v in verts if v[1] is not None], edges
+
+
+def deserialize(d, **kw):
+    return deserialize_file(cStringIO.StringIO(d), **kw)
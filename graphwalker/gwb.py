@@ -0,0 +1,318 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Spotify AB
+"""Compact binary model format.
+
+A .gwb file is a header followed by arrays of little endian 32 bit
+unsigned integers and a blob of interned, utf-8 encoded strings:
+
+  header      magic 'GWB1', then counts of verts, edges and strings
+  str_off     strings + 1 offsets into the blob
+  verts       (id, label) string numbers per vertex
+  edges       (id, label) string numbers and (src, tgt) vertex numbers
+  vert_order  vertex numbers sorted by id, for lookup by bisection
+  edge_order  edge numbers sorted by id
+  out_off     CSR offsets into out_edges, see compact.py
+  out_edges   edge numbers grouped by source vertex
+  in_off      CSR offsets into in_edges
+  in_edges    edge numbers grouped by target vertex
+  blob        the strings
+
+Labels hold the extras, as parse_name reads them. Nothing is decoded
+until asked for, so an Image over an mmap'ed file opens in constant time
+and only pages in the parts that are used. CompactGraph.read uses one
+directly; deserialize decodes all of a file read into a string at once.
+
+To convert a model from another format:
+
+  python -m graphwalker.gwb model.graphml model.gwb
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Mapping, Sequence
+
+from graphwalker import compact
+from graphwalker import graph
+
+magic = 'GWB1'
+header = struct.Struct('<4sIII')
+none = 0xffffffff
+binary = True
+
+
+def text(s):
+    try:
+        s.decode('ascii')
+        return s
+    except UnicodeDecodeError:
+        return s.decode('utf-8')
+
+
+class Ints(Sequence):
+    """Read only view of n unsigned 32 bit integers at offset in buf."""
+
+    def __init__(self, buf, offset, n):
+        self.buf, self.offset, self.n = buf, offset, n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self.n)
+            assert step == 1, 'Only contiguous slices'
+            a = array('I', self.buf[self.offset + 4 * start:
+                                    self.offset + 4 * max(start, stop)])
+            if sys.byteorder == 'big':
+                a.byteswap()
+            return a
+
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+
+        return struct.unpack_from('<I', self.buf, self.offset + 4 * i)[0]
+
+    def __reduce__(self):
+        return array, ('I', list(self))
+
+
+class Column(Sequence):
+    """View of every width'th item of ints, from start."""
+
+    def __init__(self, ints, start, width):
+        self.ints, self.start, self.width = ints, start, width
+
+    def __len__(self):
+        return len(self.ints) // self.width
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.ints[i * self.width + self.start]
+
+    def __reduce__(self):
+        return array, ('I', list(self))
+
+
+class Strings(Sequence):
+    """Strings numbered by column, looked up in the string table."""
+
+    def __init__(self, image, numbers, raw=False):
+        self.image, self.numbers, self.raw = image, numbers, raw
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __getitem__(self, i):
+        return self.image.string(self.numbers[i], self.raw)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+class Index(Mapping):
+    """{id: number} mapping, bisecting the ids in sorted order."""
+
+    def __init__(self, image, numbers, order):
+        self.keys = Strings(image, Gather(numbers, order), raw=True)
+        self.ids = Strings(image, numbers)
+        self.order = order
+
+    def __getitem__(self, key):
+        raw = key.encode('utf-8') if isinstance(key, unicode) else key
+        k = bisect_left(self.keys, raw)
+        if k == len(self.keys) or self.keys[k] != raw:
+            raise KeyError(key)
+
+        return self.order[k]
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __reduce__(self):
+        return dict, (list((k, v) for v, k in enumerate(self.ids)),)
+
+
+class Gather(Sequence):
+    """View of items[order[k]] for each k."""
+
+    def __init__(self, items, order):
+        self.items, self.order = items, order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, k):
+        return self.items[self.order[k]]
+
+
+class Image(object):
+    """The sections of a .gwb file held in buf, which may be an mmap."""
+
+    def __init__(self, buf):
+        tag, nv, ne, ns = header.unpack_from(buf, 0)
+        assert tag == magic, 'Not a gwb file'
+        self.buf = buf
+
+        offset = [header.size]
+
+        def ints(n):
+            offset[0] += 4 * n
+            return Ints(buf, offset[0] - 4 * n, n)
+
+        self.str_off = ints(ns + 1)
+        verts, edges = ints(2 * nv), ints(4 * ne)
+        self.vert_order, self.edge_order = ints(nv), ints(ne)
+        self.out_off, self.out_edges = ints(nv + 1), ints(ne)
+        self.in_off, self.in_edges = ints(nv + 1), ints(ne)
+        self.blob = offset[0]
+
+        self.vert_ids = Strings(self, Column(verts, 0, 2))
+        self.vert_names = Strings(self, Column(verts, 1, 2))
+        self.edge_ids = Strings(self, Column(edges, 0, 4))
+        self.edge_names = Strings(self, Column(edges, 1, 4))
+        self.src, self.tgt = Column(edges, 2, 4), Column(edges, 3, 4)
+
+        self.vert_index = Index(self, self.vert_ids.numbers, self.vert_order)
+        self.edge_index = Index(self, self.edge_ids.numbers, self.edge_order)
+
+    @classmethod
+    def open(cls, f):
+        return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def string(self, k, raw=False):
+        if k == none:
+            return None
+
+        s = self.buf[self.blob + self.str_off[k]:
+                     self.blob + self.str_off[k + 1]]
+        return s if raw else text(s)
+
+    def verts(self):
+        return Rows(self.vert_ids, self.vert_names)
+
+    def edges(self):
+        ids = self.vert_ids
+        return Rows(self.edge_ids, self.edge_names,
+                    Strings(self, Gather(ids.numbers, self.src)),
+                    Strings(self, Gather(ids.numbers, self.tgt)))
+
+
+class Rows(Sequence):
+    def __init__(self, *columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def __getitem__(self, i):
+        return tuple(c[i] for c in self.columns)
+
+
+def pack(verts, edges):
+    """Return the .gwb image of verts and edges.
+
+    verts are (id, label) and edges (id, label, src, tgt) tuples.
+    """
+    strings, blob = {}, []
+
+    def intern(s):
+        if s is None:
+            return none
+        if isinstance(s, unicode):
+            s = s.encode('utf-8')
+        if s not in strings:
+            strings[s] = len(blob)
+            blob.append(s)
+        return strings[s]
+
+    vert_index = {}
+    vs, es, src, tgt = array('I'), array('I'), [], []
+    for v_id, v_name in verts:
+        vert_index[v_id] = len(vert_index)
+        vs.extend((intern(v_id), intern(v_name)))
+
+    for e_id, e_name, e_src, e_tgt in edges:
+        src.append(vert_index[e_src])
+        tgt.append(vert_index[e_tgt])
+        es.extend((intern(e_id), intern(e_name), src[-1], tgt[-1]))
+
+    str_off = array('I', [0])
+    for s in blob:
+        str_off.append(str_off[-1] + len(s))
+
+    nv, ne = len(vert_index), len(src)
+    vert_order = sorted(xrange(nv), key=lambda i: blob[vs[2 * i]])
+    edge_order = sorted(xrange(ne), key=lambda j: blob[es[4 * j]])
+    out_off, out_edges = compact.csr(nv, src)
+    in_off, in_edges = compact.csr(nv, tgt)
+
+    sections = [str_off, vs, es, array('I', vert_order),
+                array('I', edge_order)] + [
+        array('I', a) for a in (out_off, out_edges, in_off, in_edges)]
+
+    if sys.byteorder == 'big':
+        for a in sections:
+            a.byteswap()
+
+    return ''.join(
+        [header.pack(magic, nv, ne, len(blob))] +
+        [a.tostring() for a in sections] + blob)
+
+
+def serialize(VE, name="G", **kw):
+    V, E = VE[:2]
+    label = graph.unparse_name
+
+    return pack(
+        [(v.id, label(v.name, v.extra)) for v in sorted(V.values())],
+        [(e.id, label(e.name, e.extra), e.src, e.tgt)
+         for e in sorted(E.values())])
+
+
+def deserialize(d, **kw):
+    """Decode the .gwb image d, held as a string, to lists of tuples.
+
+    Unlike an Image, which reads an element at a time, each section is
+    decoded in one go, which is what reading all of a model needs.
+    """
+    image = Image(d)
+    blob, str_off = image.blob, image.str_off[:]
+    vs, es = image.vert_ids.numbers.ints[:], image.edge_ids.numbers.ints[:]
+
+    raw = d[blob:]
+    decode = text if text(raw) is not raw else lambda s: s
+    strings = dict((k, decode(raw[str_off[k]:str_off[k + 1]]))
+                   for k in xrange(len(str_off) - 1))
+    strings[none] = None
+    s = strings.__getitem__
+
+    vert_ids = map(s, vs[0::2])
+    verts = zip(vert_ids, map(s, vs[1::2]))
+    v = vert_ids.__getitem__
+    edges = zip(map(s, es[0::4]), map(s, es[1::4]),
+                map(v, es[2::4]), map(v, es[3::4]))
+
+    return verts, edges
+
+
+def main(argv):
+    if len(argv) != 3:
+        print >>sys.stderr, "Usage: %s MODEL OUTPUT.gwb" % argv[0]
+        return 2
+
+    graph.Graph.read(argv[1]).write(argv[2])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Spotify AB
+"""Graph layouts read from graphviz plain output, and drawn as SVG.
+
+Running dot -Tplain on a model gives the positions of its vertices and
+the splines of its edges; the layout is made once, and any number of
+pictures with steps highlighted are drawn from it without graphviz.
+
+The plain format gives positions in inches, with y upwards:
+
+  graph scale width height
+  node name x y width height label style shape color fillcolor
+  edge tail head n x1 y1 .. xn yn [label xl yl] style color
+  stop
+"""
+import json
+import re
+from xml.sax.saxutils import escape, quoteattr
+
+from graphwalker import dot
+
+token_pattern = re.compile(r'"(?:[^"\\]|\\.)*"|\S+')
+inch = 72.0
+
+style = """
+  ellipse { fill: white; stroke: black; }
+  path { fill: none; stroke: black; }
+  text { font: 10px sans-serif; text-anchor: middle; }
+  .seen ellipse { fill: #eeeeff; }
+  .seen path { stroke: #8888ff; }
+  .hl ellipse { fill: #ffeeee; stroke: red; }
+  .hl path { stroke: red; }
+  .hl text { fill: red; }
+"""
+
+defs = """<defs><style>%s</style>
+<marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5"
+  markerWidth="8" markerHeight="8" orient="auto">
+<path d="M0,0 L10,5 L0,10 z" style="fill: black" /></marker>
+</defs>
+""" % style
+
+page = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>%(title)s</title></head>
+<body>
+<p><button id="play">play</button>
+<input id="step" type="range" min="0" max="%(last)d" value="0">
+<span id="at"></span></p>
+%(svg)s
+<script>
+var trace = %(trace)s, timer = null;
+var step = document.getElementById('step');
+
+function show(i) {
+  var els = document.querySelectorAll('.hl, .seen');
+  for (var k = 0; k < els.length; k++) {
+    els[k].classList.remove('hl', 'seen');
+  }
+  for (var k = 0; k <= i && k < trace.length; k++) {
+    var el = document.getElementById('gw-' + trace[k]);
+    if (el) el.classList.add(k == i ? 'hl' : 'seen');
+  }
+  step.value = i;
+  document.getElementById('at').textContent =
+    trace.length ? (i + 1) + '/' + trace.length + ' ' + trace[i] : '';
+}
+
+step.oninput = function () { show(+step.value); };
+document.getElementById('play').onclick = function () {
+  if (timer) { clearInterval(timer); timer = null; return; }
+  timer = setInterval(function () {
+    if (+step.value + 1 >= trace.length) {
+      clearInterval(timer); timer = null; return;
+    }
+    show(+step.value + 1);
+  }, 200);
+};
+show(0);
+</script>
+</body></html>
+"""
+
+
+def text(s):
+    return s.encode('utf-8') if isinstance(s, unicode) else s
+
+
+class Layout(object):
+    """Positions in points, with y downwards as in SVG.
+
+    nodes is {v_id: (x, y, width, height, label)} and edges is
+    {e_id: (points, label, label_position or None)}.
+    """
+
+    def __init__(self, width, height, nodes, edges):
+        self.width, self.height = width, height
+        self.nodes, self.edges = nodes, edges
+        self.body = ''.join(
+            [self.node_svg(v_id) for v_id in sorted(nodes)] +
+            [self.edge_svg(e_id) for e_id in sorted(edges)])
+
+    def node_svg(self, v_id, cls=''):
+        x, y, w, h, label = self.nodes[v_id]
+        return (
+            '<g id=%s class="%s"><ellipse cx="%.1f" cy="%.1f" rx="%.1f" '
+            'ry="%.1f" /><text x="%.1f" y="%.1f">%s</text></g>\n' % (
+                quoteattr(text('gw-' + v_id)), cls, x, y, w / 2, h / 2,
+                x, y + 4, text(escape(label))))
+
+    def edge_svg(self, e_id, cls=''):
+        points, label, at = self.edges[e_id]
+        d = 'M%.1f,%.1f' % points[0]
+        for i in xrange(1, len(points) - 2, 3):
+            d += ' C%.1f,%.1f %.1f,%.1f %.1f,%.1f' % (
+                points[i] + points[i + 1] + points[i + 2])
+
+        s = '<g id=%s class="%s"><path d="%s" marker-end="url(#arrow)" />' % (
+            quoteattr(text('gw-' + e_id)), cls, d)
+        if at is not None:
+            s += '<text x="%.1f" y="%.1f">%s</text>' % (
+                at + (text(escape(label)),))
+
+        return s + '</g>\n'
+
+    def svg_head(self):
+        return (
+            '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+            'viewBox="0 0 %d %d">\n' % ((self.width, self.height) * 2) + defs)
+
+    def write_svg(self, f, highlight=()):
+        """Write the picture, with the highlighted elements drawn on top."""
+        f.write(self.svg_head())
+        f.write(self.body)
+        for id in highlight:
+            if id in self.nodes:
+                f.write(self.node_svg(id, 'hl'))
+            if id in self.edges:
+                f.write(self.edge_svg(id, 'hl'))
+        f.write('</svg>\n')
+
+    def write_html(self, f, trace, title=''):
+        """Write a page showing the steps of trace over the picture."""
+        f.write(page % {
+            'title': text(escape(title)),
+            'last': max(len(trace) - 1, 0),
+            'trace': json.dumps(list(trace)).replace('</', '<\\/'),
+            'svg': self.svg_head() + self.body + '</svg>'})
+
+
+def parse_plain(d, E=None):
+    """Read a Layout from the dot -Tplain output d of a model with edges E.
+
+    The plain format does not give edge ids, so each edge is matched to
+    the first edge of E, in sorted order, with the same ends and label,
+    or failing that just the same ends.
+    """
+    unquote = lambda s: dot.unquote(s).replace('\\"', '"')
+    E = E if E is not None else {}
+    by_ends, unmatched = {}, set(E)
+    for e in sorted(E.values()):
+        by_ends.setdefault((e[2], e[3]), []).append(e)
+
+    width, height, nodes, edges = 0.0, 0.0, {}, {}
+    point = lambda x, y: (float(x) * inch, height - float(y) * inch)
+
+    for line in d.splitlines():
+        tokens = token_pattern.findall(line)
+        if not tokens:
+            continue
+
+        if tokens[0] == 'graph':
+            width, height = (float(t) * inch for t in tokens[2:4])
+
+        elif tokens[0] == 'node':
+            name = unquote(tokens[1])
+            nodes[name] = point(*tokens[2:4]) + (
+                float(tokens[4]) * inch, float(tokens[5]) * inch,
+                unquote(tokens[6]))
+
+        elif tokens[0] == 'edge':
+            tail, head = unquote(tokens[1]), unquote(tokens[2])
+            n = int(tokens[3])
+            points = [point(*tokens[4 + 2 * i:6 + 2 * i]) for i in xrange(n)]
+            rest = tokens[4 + 2 * n:]
+            label, at = None, None
+            if len(rest) >= 5:
+                label, at = unquote(rest[0]), point(*rest[1:3])
+
+            candidates = [e for e in by_ends.get((tail, head), ())
+                          if e[0] in unmatched]
+            same = [e for e in candidates
+                    if (e[1] or '').replace('\n', ' ') == (label or '')]
+            e_id = (same or candidates or [('%s->%s' % (tail, head),)])[0][0]
+            unmatched.discard(e_id)
+            edges[e_id] = (points, label, at)
+
+        elif tokens[0] == 'stop':
+            break
+
+    return Layout(width, height, nodes, edges)
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2013 Spotify AB
+import bisect
 import logging
 import pdb
 import random
 import sys
+from collections import deque
 
 from graphwalker import codeloader
 from graphwalker import halting
@@ -24,17 +26,14 @@ class Planner(object):
         self.rng = self.randcls(self.kw.get('seed'))
 
     def _setup(self, g, stop, start, context):
-        for ident, vert in g.V.items():
-            if vert.name == start:
-                self.vert = vert
-                break
-        else:
+        self.vert = g.vert_by_name(start)
+        if self.vert is None:
             if start in g.V:
                 self.vert = g.V[start]
             else:
                 raise RuntimeError("Could not find start vertex")
 
-        stop.add(vert)
+        stop.add(self.vert)
 
         self.g, self.plan, self.stop = g, [], stop
 
@@ -47,12 +46,11 @@ class Planner(object):
         larger string of single-edge vertices. This enters them into the plan.
         """
         plan = plan if plan is not None else self.plan
-        I, O = self.g.vert_degrees()
+        I, O = self.g.vert_degrees()  # kept current by del_vert
 
         while len(self.vert.outgoing) == 1 and I[self.vert.id] == 0:
             self.g.del_vert(self.vert)
             self.vert = self.step(self.vert, self.vert.outgoing[0], plan)
-            I, O = self.g.vert_degrees()
 
     def visit(self, it, plan=None):
         plan = self.plan if plan is None else plan
@@ -93,7 +91,16 @@ class EvenRandom(Planner):
 class Random(EvenRandom):
     """Walk through the graph by random edges until done."""
 
-    def choose_edge(self, edges):
+    def __init__(self, *al, **kw):
+        super(Random, self).__init__(*al, **kw)
+        self.tables = {}
+
+    @staticmethod
+    def compile(edges):
+        """Return (choices, cumulative weights) for the weighted edges.
+
+        Returns None when no edge has a weight, so an even choice will do.
+        """
         naive, weighted = [], []
         for e in edges:
             if e.weight is None:
@@ -104,7 +111,7 @@ class Random(EvenRandom):
                 weighted.append((e, float(e.weight)))
 
         if not weighted:
-            return self.rng.choice(edges)
+            return None
 
         total_given_probability = sum(w for e, w in weighted)
         remaining = 1.0 - total_given_probability
@@ -121,13 +128,28 @@ class Random(EvenRandom):
             if remaining >= 0.01:
                 log.warn("Weighted edges sum to less than unity")
 
-        x, X = 0, self.rng.uniform(0.0, sum(w for e, w in weighted))
+        choices, cumulative, x = [], [], 0
         for e, w in weighted:
             x += w
-            if x >= X:
-                return e
+            choices.append(e)
+            cumulative.append(x)
 
-        return e
+        return choices, cumulative
+
+    def choose_edge(self, edges):
+        # Tables are kept by the identity of the edge sequence, which
+        # changes whenever the graph replaces the vertex.
+        table = self.tables.get(id(edges))
+        if table is None or table[0] is not edges:
+            table = self.tables[id(edges)] = (edges, self.compile(edges))
+
+        if table[1] is None:
+            return self.rng.choice(edges)
+
+        choices, cumulative = table[1]
+        i = bisect.bisect_left(
+            cumulative, self.rng.uniform(0.0, cumulative[-1]))
+        return choices[min(i, len(choices) - 1)]
 
 
 class Euler(Planner):
@@ -141,62 +163,133 @@ class Euler(Planner):
         self.g.eulerize()
 
         self.stop = halting.Never().start(g, None)
-        vert = self.vert
-        seen = set()
-
-        def loop(vert):
-            subplan = []
-            begin = vert
-            while len(seen) < len(self.g.E):
-                for edge in vert.outgoing:
-                    if edge.id not in seen:
-                        seen.add(edge.id)
-                        vert = self.step(vert, edge, subplan)
-                        break
-                else:
-                    assert vert.id == begin.id, "Graph is not Eulerian"
-                    break
 
-            return subplan
+        self.plan, plan = [], self.plan + self.circuit(self.vert)
+        for step in plan:
+            if stop:
+                break
+            self.visit(step)
 
-        plan = loop(vert)  # initial plan
+        return self.plan
 
-        while len(seen) < len(self.g.E):
-            j = 0
-            for i in range(len(plan)):
-                if self.g.V.get(plan[i].id) is not plan[i]:
-                    continue
+    def circuit(self, vert):
+        """Return the plan for an Euler circuit from vert, by Hierholzer.
 
-                vert = plan[i]
-                for edge in vert.outgoing:
-                    if edge.id not in seen:
-                        # splice new loop into plan
-                        plan[i + 1: i + 1] = loop(vert)
-                        j += 1
-                        break
+        Each vertex keeps a cursor into its outgoing edges, so every edge
+        is looked at once. Vertices are pushed on a stack as the walk goes
+        and popped when they run out of edges, which gives the circuit
+        backwards with all subloops already spliced in.
+        """
+        I, O = self.g.vert_degrees()
+        assert all(I[v] == O[v] for v in I), "Graph is not Eulerian"
+
+        V = self.g.V
+        cursor = {}
+        stack, circuit = [(None, vert)], []
+
+        while stack:
+            edge, vert = stack[-1]
+            i = cursor.get(vert.id, 0)
+            if i < len(vert.outgoing):
+                cursor[vert.id] = i + 1
+                edge = vert.outgoing[i]
+                stack.append((edge, V[edge.tgt]))
             else:
-                assert j, "Graph is not connected"
+                circuit.append(stack.pop())
 
-        self.plan, plan = [], self.plan + plan
-        for step in plan:
-            if stop:
+        assert len(circuit) - 1 == len(self.g.E), "Graph is not connected"
+
+        plan = []
+        for edge, vert in reversed(circuit[:-1]):
+            plan.append(edge)
+            plan.append(vert)
+
+        return plan
+
+
+class StreamingEuler(Euler):
+    """Walk through the graph by ordered edges, yielding steps as planned.
+
+    The graph is still eulerized before the first step of the circuit;
+    only the walk itself is streamed.
+    """
+
+    def __call__(self, g, stop, start, context):
+        self._setup(g, stop, start, context)
+
+        self.g = self.g.copy()
+        self.stop = halting.Never().start(g, None)
+        self.forced_plan()
+        self.stop = stop
+
+        return iter(self)
+
+    def __iter__(self):
+        forced, self.plan = self.plan, []
+
+        for step in forced:
+            if self.stop:
+                return
+            self.stop.add(step)
+            yield step
+
+        self.g.eulerize()
+
+        for step in self.walk(self.vert):
+            if self.stop:
+                return
+            self.stop.add(step)
+            yield step
+
+    def walk(self, vert):
+        """Generate the steps of an Euler circuit from vert, by Hierholzer.
+
+        Whenever the walk reaches a vertex with unused edges, a closed loop
+        from there is put first in the queue of pending steps. Everything
+        before that vertex is final, so steps are yielded as soon as the
+        first loop is found.
+        """
+        I, O = self.g.vert_degrees()
+        assert all(I[v] == O[v] for v in I), "Graph is not Eulerian"
+
+        V = self.g.V
+        cursor, pending, walked = {}, deque(), 0
+
+        while True:
+            loop, v = [], vert
+            i = cursor.get(v.id, 0)
+            while i < len(v.outgoing):
+                cursor[v.id] = i + 1
+                edge = v.outgoing[i]
+                v = V[edge.tgt]
+                loop.append((edge, v))
+                i = cursor.get(v.id, 0)
+
+            assert v.id == vert.id, "Graph is not Eulerian"
+            walked += len(loop)
+            pending.extendleft(reversed(loop))
+
+            if not pending:
                 break
-            self.visit(step)
 
-        return self.plan
+            edge, vert = pending.popleft()
+            yield edge
+            yield vert
+
+        assert walked == len(self.g.E), "Graph is not connected"
 
 
 class Goto(Planner):
     """Plan direct path to goal state(s), repeating [repeat] times."""
 
     def __init__(self, *al, **kw):
-        self.al, self.kw = al, kw
+        self.repeat = int(kw.pop('repeat', 1))
+        super(Goto, self).__init__(*al, **kw)
         self.goals = self.al
-        self.repeat = kw.pop('repeat', 1)
 
     def __call__(self, g, stop, start, context):
         self._setup(g, stop, start, context)
-        self.d = d = self.g.all_pairs_shortest_path()
+        self.check_goals()
 
         for i in xrange(self.repeat or inf):
             for goal in self.goals:
@@ -205,8 +298,9 @@ class Goto(Planner):
                 if goal == 'random':
                     goal = self.rng.choice(self.g.V.keys())
 
+                tree = self.g.paths_from(self.vert.id)
                 try:
-                    cost, path = min(d[(self.vert.id, v.id)]
+                    cost, path = min(tree[v.id]
                                      for v in self.g.V.values()
                                      if ((v.name == goal or
                                           v.id == goal) and
@@ -215,6 +309,9 @@ class Goto(Planner):
                 except ValueError:
                     continue
 
+                if plan is None:
+                    continue
+
                 for item in plan:
                     edge = [e for e in self.vert.outgoing
                             if e.tgt == item][0]
@@ -222,6 +319,16 @@ class Goto(Planner):
 
         return self.plan
 
+    def check_goals(self):
+        """Warn up front about goals that can not be reached from start."""
+        for goal in self.goals:
+            if goal != 'random' and not any(
+                    self.g.reaches(self.vert.id, v.id)
+                    for v in self.g.V.values()
+                    if v.name == goal or v.id == goal):
+                log.warning("Goal %s can not be reached from %s",
+                            goal, self.vert.name)
+
 
 class Interactive(Planner):
     """Planner that yields steps (or not) from user interaction.
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2013 Spotify AB
+import collections
 import os
+import subprocess
 import sys
 import logging
+import threading
 
 from graphwalker import codeloader
+from graphwalker import layout
 from graphwalker import tapping
 
 log = logging.getLogger(__name__)
@@ -145,20 +149,112 @@ class PathRecorder(ReportingPlugin):
         del self.f
 
 
+class RenderPool(object):
+    """Run render(frame) for frames on background threads.
+
+    At most keep frames wait for a free thread. When one more comes, the
+    'block' policy waits for room, 'drop' forgets the oldest waiting frame
+    and 'last' holds off rendering until close, so only the last keep
+    frames are rendered at all. Finished (frame, result) pairs are picked
+    up with ready() by the thread that put the frames.
+    """
+
+    policies = ('block', 'drop', 'last')
+
+    def __init__(self, render, jobs=1, policy='block', keep=4):
+        assert policy in self.policies, 'Unknown policy %r' % policy
+        assert jobs > 0 and keep > 0
+        self.render, self.policy, self.keep = render, policy, keep
+        self.waiting, self.finished = collections.deque(), []
+        self.dropped, self.closing = 0, False
+        self.cond = threading.Condition()
+        self.threads = [threading.Thread(target=self.work)
+                        for i in xrange(jobs)]
+        for t in self.threads:
+            t.daemon = True
+            t.start()
+
+    def put(self, frame):
+        with self.cond:
+            if self.policy == 'block':
+                while len(self.waiting) >= self.keep:
+                    self.cond.wait()
+            elif len(self.waiting) >= self.keep:
+                self.waiting.popleft()
+                self.dropped += 1
+
+            self.waiting.append(frame)
+            self.cond.notify_all()
+
+    def work(self):
+        while True:
+            with self.cond:
+                while not (self.closing or
+                           self.waiting and self.policy != 'last'):
+                    self.cond.wait()
+
+                if not self.waiting:
+                    return
+
+                frame = self.waiting.popleft()
+                self.cond.notify_all()
+
+            try:
+                result = self.render(frame)
+            except Exception as e:
+                log.exception("Rendering %r failed", frame)
+                result = e
+
+            with self.cond:
+                self.finished.append((frame, result))
+
+    def ready(self):
+        with self.cond:
+            finished, self.finished = self.finished, []
+
+        return finished
+
+    def close(self):
+        """Render what is still waiting and return the last ready()."""
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+
+        for t in self.threads:
+            t.join()
+
+        return self.ready()
+
+
 class Cartographer(ReportingPlugin):
-    """Report graph and path steps to a graphviz file and run dot."""
+    """Report graph and path steps to a graphviz file and run dot.
+
+    The dot runs are made in the step itself, or by a RenderPool of
+    'jobs' threads if jobs is set. With 'batch' set to n, frames are
+    collected and each n of them, and the rest when the test ends, are
+    rendered by one dot run. Images are attached as they are ready, which
+    with a pool is at the start of a later step or at the end.
+    """
 
     file = file
     system = os.system
+    rename = os.rename
     command = 'dot -T%(imgtype)s -o %(imgfname)s %(dotfname)s'
+    batch_command = 'dot -T%(imgtype)s -O %(dotfnames)s'
 
     def __init__(self, **kw):
         super(Cartographer, self).__init__(**kw)
         self.i = 0
+        self.pool = None
+        self.frames = []
         self.context.setdefault('dotpath', '.')
         self.context.setdefault('imgpath', '.')
         self.context.setdefault('imgtype', 'png')
         self.context.setdefault('attach', False)
+        self.context.setdefault('jobs', 0)
+        self.context.setdefault('policy', 'block')
+        self.context.setdefault('keep', 4)
+        self.context.setdefault('batch', 0)
 
     def step_begin(self, step):
         name, self.i = '%s_%04d' % (self.test_name, self.i), self.i + 1
@@ -169,14 +265,132 @@ class Cartographer(ReportingPlugin):
         imgfname = os.path.join(imgpath, name + '.' + imgtype)
 
         self.context['model'].write(dotfname, highlight=(step[0],))
+        self.frames.append((dotfname, imgfname, imgtype))
+
+        if len(self.frames) >= int(self.context['batch']):
+            self.flush()
+
+    def flush(self):
+        frames, self.frames = self.frames, []
+        if not frames:
+            return
+
+        if not int(self.context['jobs']):
+            self.deliver([(frames, self.render(frames))])
+            return
+
+        if self.pool is None:
+            self.pool = RenderPool(
+                self.render, int(self.context['jobs']),
+                self.context['policy'], int(self.context['keep']))
+
+        self.pool.put(frames)
+        self.deliver(self.pool.ready())
+
+    def render(self, frames):
+        if len(frames) == 1:
+            dotfname, imgfname, imgtype = frames[0]
+            return self.system(
+                self.command %
+                {'dotfname': dotfname, 'imgfname': imgfname,
+                 'imgtype': imgtype})
+
+        # dot -O names each image after its input, so move them in place.
+        imgtype = frames[0][2]
         rc = self.system(
-            self.command %
-            {'dotfname': dotfname, 'imgfname': imgfname, 'imgtype': imgtype})
+            self.batch_command %
+            {'dotfnames': ' '.join(f[0] for f in frames), 'imgtype': imgtype})
+
+        if not rc:
+            for dotfname, imgfname, imgtype in frames:
+                self.rename(dotfname + '.' + imgtype, imgfname)
+
+        return rc
 
-        if self.context.get('attach') and not rc:
-            r = self.context['reporter']
-            with self.file(imgfname) as f:
-                r.attach_to_step(dotfname, f.read())
+    def deliver(self, finished):
+        if not self.context.get('attach'):
+            return
+
+        r = self.context['reporter']
+        for frames, rc in finished:
+            for dotfname, imgfname, imgtype in frames if not rc else ():
+                with self.file(imgfname) as f:
+                    r.attach_to_step(dotfname, f.read())
+
+    def finalize(self, failure=False):
+        self.flush()
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            self.deliver(pool.close())
+            if pool.dropped:
+                log.info("Cartographer dropped %d renders", pool.dropped)
+
+
+class Atlas(ReportingPlugin):
+    """Lay the graph out once with dot and draw the steps over it.
+
+    The 'html' format writes one page per test at [path]/[name].html with
+    the steps in it; 'svg' writes a picture per step. Either way dot runs
+    only when the model changes.
+    """
+
+    file = file
+    output = staticmethod(
+        lambda command: subprocess.check_output(command, shell=True))
+    command = 'dot -Tplain %(dotfname)s'
+    formats = ('html', 'svg')
+
+    def __init__(self, **kw):
+        super(Atlas, self).__init__(**kw)
+        self.layout, self.version = None, None
+        self.context.setdefault('path', '.')
+        self.context.setdefault('format', 'html')
+        self.context.setdefault('attach', False)
+        assert self.context['format'] in self.formats, (
+            'Unknown format %r' % self.context['format'])
+
+    def initiate(self, test_name):
+        super(Atlas, self).initiate(test_name)
+        self.name = self.context.get('name') or test_name
+        self.trace = []
+
+    def get_layout(self):
+        model = self.context['model']
+        version = (id(model), getattr(model, 'version', None))
+        if self.layout is None or self.version != version:
+            dotfname = os.path.join(self.context['path'], self.name + '.dot')
+            model.write(dotfname)
+            self.layout = layout.parse_plain(
+                self.output(self.command % {'dotfname': dotfname}), model.E)
+            self.version = version
+
+        return self.layout
+
+    def save(self, fn, write, attach_to):
+        with self.file(fn, 'w') as f:
+            write(f)
+
+        if self.context.get('attach'):
+            with self.file(fn) as f:
+                getattr(self.context['reporter'], attach_to)(
+                    os.path.basename(fn), f.read())
+
+    def step_begin(self, step):
+        self.trace.append(step[0])
+        if self.context['format'] == 'svg':
+            fn = os.path.join(self.context['path'], '%s_%04d.svg' % (
+                self.name, len(self.trace) - 1))
+            self.save(
+                fn, lambda f: self.get_layout().write_svg(f, (step[0],)),
+                'attach_to_step')
+
+    def finalize(self, failure=False):
+        if self.context['format'] == 'html':
+            fn = os.path.join(self.context['path'], self.name + '.html')
+            self.save(
+                fn, lambda f: self.get_layout().write_html(
+                    f, self.trace, self.test_name),
+                'attach_to_test')
 
 
 class Attachments(ReportingPlugin):
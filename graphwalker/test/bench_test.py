@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Spotify AB
+import json
+import StringIO
+import unittest
+
+from graphwalker import bench
+from graphwalker import graph
+
+
+class TestBench(unittest.TestCase):
+    def test_shapes_connected(self):
+        for shape in bench.shapes:
+            verts, edges = bench.synthesize(shape, 20)
+            g = graph.Graph.build(verts, edges)
+            self.assertTrue(g.sanity_check())
+            self.assertEqual(len(g.paths_from('start').dist), len(g.V))
+
+    def test_writers(self):
+        verts, edges = bench.synthesize('unbalanced', 10)
+        for fmt in 'tgf', 'gml', 'graphml', 'gwb':
+            codec = graph.Graph.get_codec('model.' + fmt)
+            v, e = codec.deserialize(bench.writers[fmt](verts, edges))
+            self.assertEqual(sorted(x[1] for x in v),
+                             sorted(x[1] for x in verts))
+            self.assertEqual(sorted(x[1] for x in e),
+                             sorted(x[1] for x in edges))
+
+    def test_measure(self):
+        seconds, rise_kb, error = bench.measure(
+            lambda: None, lambda arg: ' ' * (64 << 20))
+        self.assertEqual(error, None)
+        self.assertTrue(64 << 10 <= rise_kb < 2 * (64 << 10))
+
+    def test_main(self):
+        out = StringIO.StringIO()
+        bench.main(['bench', '--size=10', '--steps=10', '--no-fork',
+                    '--format=tgf'], out)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        cases = [r['case'] for r in results]
+        self.assertEqual(cases[:4], ['read.tgf', 'build',
+                                     'all_pairs_shortest_path', 'eulerize'])
+        self.assertTrue('plan.Random' in cases)
+        self.assertEqual([r['error'] for r in results], [None] * len(cases))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Spotify AB
+import os
+import shutil
+import tempfile
+import unittest
+
+from graphwalker import cache
+from graphwalker import cli
+from graphwalker import compact
+from graphwalker import graph
+
+
+class TestModelCache(unittest.TestCase):
+    here = lambda s, n: os.path.join(os.path.dirname(__file__), n)
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='graphwalker-cache-test-')
+        self.fn = os.path.join(self.path, 'model.tgf')
+        shutil.copy(self.here('examples/odd.tgf'), self.fn)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def cache(self, *names):
+        return cache.ModelCache(list(names or [self.fn]), self.path)
+
+    def test_miss(self):
+        self.assertEqual(self.cache().load(), None)
+
+    def test_round_trip(self):
+        g = graph.Graph.read(self.fn)
+        g.all_pairs_shortest_path()
+        self.cache().store((g, 'actor'))
+
+        h, actor = self.cache().load()
+        self.assertEqual(actor, 'actor')
+        self.assertEqual(sorted(g.V.items()), sorted(h.V.items()))
+        self.assertEqual(sorted(g.E.items()), sorted(h.E.items()))
+        self.assertEqual(dict(g.d), dict(h.d))
+
+    def test_compact_round_trip(self):
+        g = compact.CompactGraph.read(self.fn)
+        g.paths_from('1')
+        self.cache().store(g)
+
+        h = self.cache().load()
+        self.assertEqual(sorted(g.V.items()), sorted(h.V.items()))
+        self.assertEqual(h.trees.keys(), ['1'])
+        self.assertEqual(g.paths_from('2').dist, h.paths_from('2').dist)
+
+    def test_key(self):
+        key = self.cache().key
+        self.assertEqual(self.cache().key, key)
+        self.assertNotEqual(self.cache(self.fn, 'actor').key, key)
+
+        with open(self.fn, 'a') as f:
+            f.write('9 Extra\n')
+        self.assertNotEqual(self.cache().key, key)
+
+    def test_key_format(self):
+        key = self.cache().key
+        cache.cache_format += 1
+        try:
+            self.assertNotEqual(self.cache().key, key)
+        finally:
+            cache.cache_format -= 1
+
+    def test_store_failure(self):
+        c = self.cache()
+        self.assertRaises(Exception, c.store, lambda: None)
+        self.assertEqual(os.listdir(self.path), ['model.tgf'])
+
+    def test_broken_entry(self):
+        with open(self.cache().fn, 'w') as f:
+            f.write('garbage')
+        self.assertEqual(self.cache().load(), None)
+
+    def test_cli(self):
+        args = ['gw', '--cache', self.path, self.fn, 'actor']
+        ns = cli.arg_parser().parse_args(args[1:])
+
+        models_cache = self.cache(self.fn, 'actor')
+        model, actor = cli.load_model_actor(ns, models_cache)
+        self.assertEqual(actor, 'actor')
+
+        os.unlink(self.fn)
+        cached, actor = cli.load_model_actor(ns, models_cache)
+        self.assertEqual(sorted(model.V.items()), sorted(cached.V.items()))
+
+    def test_store_after_run(self):
+        stored, runs = [], []
+        models_cache = self.cache()
+        models_cache.store = stored.append
+        ns = cli.arg_parser().parse_args(['--cache', self.path, self.fn])
+
+        class Dummy(object):
+            def __getattr__(self, name):
+                return lambda *al: None
+
+        class executor(object):
+            @staticmethod
+            def run(test, path, context):
+                runs[-1](context['model'])
+
+        def run(model, paths):
+            runs.append(paths)
+            cli.run_context(
+                ns, model, 'actor', lambda *al: [], Dummy(), Dummy(),
+                executor, {'model': model}, models_cache=models_cache)
+
+        model = graph.Graph.read(self.fn)
+        run(model, lambda g: None)
+        self.assertEqual(stored, [])
+
+        run(model, lambda g: g.paths_from('1'))
+        self.assertEqual(len(stored), 1)
+
+        run(model, lambda g: g.paths_from('1'))
+        self.assertEqual(len(stored), 1)
+
+        run(model, lambda g: g.all_pairs_shortest_path())
+        self.assertEqual(len(stored), 2)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Spotify AB
+import os
+import unittest
+
+from graphwalker import compact
+from graphwalker import graph
+from graphwalker import halting
+from graphwalker import planning
+
+
+class TestCompactGraph(unittest.TestCase):
+    here = lambda s, n: os.path.join(os.path.dirname(__file__), n)
+
+    def read(self, name):
+        fn = self.here('examples/' + name)
+        return graph.Graph.read(fn), compact.CompactGraph.read(fn)
+
+    def test_same_as_graph(self):
+        g, c = self.read('odd.graphml')
+        self.assertEqual(sorted(g.V.items()), sorted(c.V.items()))
+        self.assertEqual(sorted(g.E.items()), sorted(c.E.items()))
+        self.assertTrue(c.sanity_check())
+
+    def test_vert_degrees(self):
+        g, c = self.read('odd.tgf')
+        self.assertEqual(g.vert_degrees(), c.vert_degrees())
+        self.assertEqual(g.odd_verts(), c.odd_verts())
+
+    def test_lazy(self):
+        g, c = self.read('odd.graphml')
+        self.assertEqual(c.V.made, {})
+        v = c.V['n1']
+        self.assertTrue(c.V['n1'] is v)
+        self.assertEqual(len(c.V.made), 1)
+        self.assertEqual(len(c.E.made), len(v.incoming + v.outgoing))
+
+    def test_vert_by_name(self):
+        g, c = self.read('odd.graphml')
+        self.assertEqual(c.vert_by_name('v_c'), g.vert_by_name('v_c'))
+        self.assertEqual(c.vert_by_name('nope'), None)
+        self.assertEqual(len(c.V.made), 1)
+
+    def test_walk_is_lazy(self):
+        n = 2000
+        c = compact.CompactGraph(
+            [('Start', 'Start')] + [('v%d' % i, 'v_%d' % i) for i in range(n)],
+            [('e', 'e', 'Start', 'v0')] +
+            [('e%d' % i, 'e_%d' % i, 'v%d' % i, 'v%d' % ((i * 7 + 1) % n))
+             for i in range(n)])
+
+        stop = halting.CountSteps(10)
+        stop.start(c)
+        steps = list(planning.Random(seed=1)(c, stop, 'Start', {}))
+
+        self.assertTrue(steps)
+        self.assertTrue(len(c.V.made) <= 11)
+        self.assertTrue(len(c.E.made) <= 3 * 11)
+
+    def test_paths(self):
+        g, c = self.read('odd.gml')
+        for v_id in g.V:
+            self.assertEqual(g.paths_from(v_id).dist,
+                             c.paths_from(v_id).dist)
+            self.assertFalse(c.is_stuck(c.V[v_id]))
+
+    def test_blocked(self):
+        c = compact.CompactGraph.build(
+            [('a', 'a'), ('b', 'b\nBLOCKED'), ('c', None)],
+            [('p', 'p', 'a', 'c'), ('q', 'q', 'a', 'b'),
+             ('r', 'r\nBLOCKED', 'c', 'a')])
+        self.assertEqual(sorted(c.V), ['a', 'c'])
+        self.assertEqual(sorted(c.E), ['p'])
+
+    def test_copy_is_mutable(self):
+        g, c = self.read('odd.graphml')
+        g = c.copy()
+        g.add_edge(g.V['n5'], g.V['n0'])
+        self.assertTrue(g.sanity_check())
+        self.assertEqual(len(g.E), len(c.E) + 1)
+
+    def test_merge(self):
+        c = compact.CompactGraph.merge([
+            compact.CompactGraph.read(self.here('examples/first.tgf')),
+            compact.CompactGraph.read(self.here('examples/second.tgf')),
+            compact.CompactGraph.read(self.here('examples/third.tgf'))])
+        g = graph.Graph.merge([
+            graph.Graph.read(self.here('examples/first.tgf')),
+            graph.Graph.read(self.here('examples/second.tgf')),
+            graph.Graph.read(self.here('examples/third.tgf'))])
+        self.assertTrue(isinstance(c, compact.CompactGraph))
+        self.assertEqual(sorted(g.E.items()), sorted(c.E.items()))
+        self.assertEqual(g.vert_degrees(), c.vert_degrees())
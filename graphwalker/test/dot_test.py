@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Spotify AB
+import StringIO
+import os
+import unittest
+
+from graphwalker import dot
+
+
+class TestDot(unittest.TestCase):
+    here = lambda s, n: os.path.join(os.path.dirname(__file__), n)
+
+    def test_example_abz(self):
+        with file(self.here('examples/abz.dot')) as f:
+            verts, edges = dot.deserialize(f.read())
+
+        self.assertEqual(
+            sorted(verts),
+            [('n0', 'Start'),
+             ('n1', 'v_a'),
+             ('n2', 'v_b'),
+             ('n3', 'v_c')])
+
+        self.assertEqual(
+            sorted(edges),
+            [('e0', 'e_zero', 'n0', 'n1'),
+             ('e1', 'e_one', 'n1', 'n2'),
+             ('e2', 'e_two', 'n2', 'n3')])
+
+    def test_example_odd(self):
+        with file(self.here('examples/odd.dot')) as f:
+            verts, edges = dot.deserialize(f.read())
+
+        self.assertEqual(
+            sorted(verts),
+            [('Start', 'Start'), ('a', 'a'), ('b', 'b'), ('c', 'c'),
+             ('d', 'd'), ('e', 'e')])
+        self.assertEqual(len(edges), 7)
+        self.assertEqual(edges[0], ('e0', 'e_once', 'Start', 'a'))
+
+    def test_syntax(self):
+        verts, edges = dot.deserialize("""
+# preprocessor line
+strict digraph "G" {
+  /* block
+     comment */
+  rankdir=LR; node [shape=box]; edge [color=red]
+  graph [label="ignored"];
+  "a b" [label="first \\"one\\"", shape=box] [color=red];
+  c [label="con" + "cat"]
+  a2 -> "a b" -> c:port [label=chain]  // line comment
+  {x y} -> z;
+  subgraph cluster_0 { label="sub"; q -> r [style=dotted] }
+  -1.5 -> a2
+}
+""")
+        self.assertEqual(verts, [
+            ('a b', 'first \\"one\\"'), ('c', 'concat'), ('a2', 'a2'),
+            ('x', 'x'), ('y', 'y'), ('z', 'z'), ('q', 'q'), ('r', 'r'),
+            ('-1.5', '-1.5')])
+        self.assertEqual(edges, [
+            ('e0', 'chain', 'a2', 'a b'), ('e1', 'chain', 'a b', 'c'),
+            ('e2', None, 'x', 'z'), ('e3', None, 'y', 'z'),
+            ('e4', None, 'q', 'r'), ('e5', None, '-1.5', 'a2')])
+
+    def test_undirected(self):
+        verts, edges = dot.deserialize('graph { a -- b [label=l] }')
+        self.assertEqual(edges, [('e0', 'l', 'a', 'b'), ('e1', 'l', 'b', 'a')])
+
+    def test_errors(self):
+        self.assertRaises(AssertionError, dot.deserialize, 'digraph { a -> }')
+        self.assertRaises(AssertionError, dot.deserialize, 'digraph { a ')
+        self.assertRaises(AssertionError, dot.deserialize, 'tree { a }')
+        self.assertRaises(AssertionError, dot.deserialize, 'digraph { a ! }')
+
+    def test_round_trip(self):
+        with file(self.here('examples/abz.dot')) as f:
+            verts, edges = dot.deserialize(f.read())
+
+        V = dict((v[0], v) for v in verts)
+        E = dict((e[0], e) for e in edges)
+        again = dot.deserialize(dot.serialize((V, E), 'abz'))
+        self.assertEqual(sorted(again[0]), sorted(verts))
+        self.assertEqual(sorted(e[1:] for e in again[1]),
+                         sorted(e[1:] for e in edges))
+
+    def test_highlight(self):
+        V = {'a': ('a', 'A'), 'b': ('b', u'B\xe5')}
+        E = {'e0': ('e0', 'x', 'a', 'b'), 'e1': ('e1', None, 'b', 'a')}
+        doc = dot.Document((V, E))
+        lines = [
+            'digraph "g" {',
+            '  "a" [label="A"%s];',
+            '  "b" [label="B\xc3\xa5"%s];',
+            '',
+            '  "a" -> "b" [label="x"%s];',
+            '  "b" -> "a" [label=""%s];',
+            '}',
+            '']
+
+        for highlight in [(), ('a',), ('e1', 'a', 'e1'), ('b', 'e0', 'no')]:
+            f = StringIO.StringIO()
+            doc.write(f, 'g', highlight=highlight)
+            marks = [dot.highattr if id in highlight else ''
+                     for id in ['a', 'b', 'e0', 'e1']]
+            self.assertEqual(f.getvalue(), '\n'.join(lines) % tuple(marks))
+
+        self.assertEqual(dot.serialize((V, E), 'g', highlight=('b',)),
+                         '\n'.join(lines) % ('', dot.highattr, '', ''))
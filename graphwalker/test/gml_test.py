@@ -33,3 +33,22 @@ graph [
             [('e0', 'e_zero', '0', '1'),
              ('e1', 'e_one', '1', '2'),
              ('e2', 'e_two', '2', '3')])
+
+    def test_parse_nested(self):
+        tokens = ['a', '1', 'b', '[', 'c', '"x y"', 'd', '[', 'e', '2.5', ']',
+                  ']', 'f', '3', ']', 'ignored', '4']
+        self.assertEqual(
+            gml.parse(tokens),
+            (('a', 1), ('b', (('c', 'x y'), ('d', (('e', 2.5),)))), ('f', 3)))
+
+    def test_deep(self):
+        n = 10000
+        data = 'graph [ %s %s node [ id 0 ] ]' % ('a [ ' * n, ' ]' * n)
+        self.assertEqual(gml.deserialize(data), ([('0', '0')], []))
+
+    def test_comments(self):
+        data = self.data0.replace('\n', '\n  # a comment\n', 3)
+        self.assertEqual(gml.deserialize(data), gml.deserialize(self.data0))
+
+    def test_bad_key(self):
+        self.assertRaises(AssertionError, gml.deserialize, 'graph [ 1 2 ]')
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2013 Spotify AB
+import os
 import unittest
 
 from graphwalker import graph
@@ -45,6 +46,18 @@ class TestEdge(unittest.TestCase):
         e2 = ee('e0', 'edge0', 'sow', 'tgt', {'b': 2})
         self.assertRaises(AssertionError, e1.combine, e2)
 
+    def test_slots(self):
+        e = ee('id', 'name\nweight=0.5\nBLOCKED\nother=x', 'src', 'tgt')
+        self.assertEqual(vars(e), {'weight': '0.5', 'BLOCKED': True})
+        self.assertEqual((e.weight, e.BLOCKED, e.cost), ('0.5', True, None))
+        self.assertEqual(e.other, 'x')
+        self.assertEqual(ee('id', 'name', 'src', 'tgt').weight, None)
+
+    def test_slots_replace(self):
+        e = ee('id', 'name\nweight=0.5', 'src', 'tgt')._replace(id='new')
+        self.assertEqual(type(e), ee)
+        self.assertEqual((e.id, e.weight), ('new', '0.5'))
+
 
 class TestVert(unittest.TestCase):
     def test_ctor_smoke(self):
@@ -72,6 +85,13 @@ class TestVert(unittest.TestCase):
             v1.combine(v2),
             vv('v0', 'vert0', (), ()))
 
+    def test_without_edge_by_id(self):
+        e0, e1 = ee('e0', 'edge0', 'v0', 'v1'), ee('e1', 'edge1', 'v0', 'v0')
+        v = vv('v0', 'vert0\nBLOCKED', (e0, e1), (e1,))
+        w = v.without_edge_by_id('e1')
+        self.assertEqual(w, vv('v0', 'vert0\nBLOCKED', (e0,), ()))
+        self.assertEqual(w.BLOCKED, True)
+
     def test_combine_add_edges(self):
         v1 = vv('v0', 'vert0', (ee('e0', 'edge0', 'v0', 'v1'),), ())
         v2 = vv('v0', 'vert0', (), (ee('e1', 'edge1', 'v1', 'v0'),))
@@ -229,6 +249,23 @@ class TestGraph(unittest.TestCase):
             ({'a': 0, 'b': 1},   # I
              {'a': 1, 'b': 0}))  # O
 
+    def test_vert_degrees_kept(self):
+        g = build_graph('ab bc ca cd')
+        I, O = g.vert_degrees()
+        g.add_edge(g.V['d'], g.V['a'])
+        g.copy_edge(g.E['a-b'])
+        g.del_vert(g.V['c'])
+        self.assertEqual((I, O), g.vert_degrees())
+        self.assertEqual(
+            (I, O),
+            ({'a': 1, 'b': 2, 'd': 0}, {'a': 2, 'b': 0, 'd': 1}))
+
+    def test_del_vert_loop(self):
+        g = build_graph('ab bb ba')
+        g.del_vert(g.V['b'])
+        self.assertEqual(g.V, {'a': vv('a', 'a', (), ())})
+        self.assertEqual(g.E, {})
+
     def test_odd_verts(self):
         E = {'p': ee(*'ppab'), 'q': ee(*'qqbc')}
 
@@ -250,18 +287,167 @@ class TestGraph(unittest.TestCase):
             ('b', 'b'): (0, ()),
         })
 
+    def test_apsp_paths(self):
+        g = build_graph('ab bc cd ad da')
+        d = g.all_pairs_shortest_path()
+        self.assertEqual(d[('a', 'd')], (1, ('d',)))
+        self.assertEqual(d[('b', 'a')], (3, ('c', 'd', 'a')))
+        self.assertEqual(d[('c', 'b')], (3, ('d', 'a', 'b')))
+        self.assertEqual(len(d), 16)
+
+    def test_apsp_cached(self):
+        g = build_graph('ab bc')
+        self.assertTrue(
+            g.all_pairs_shortest_path() is g.all_pairs_shortest_path())
+
+    def test_apsp_missing_key(self):
+        g = build_graph('ab bc')
+        d = g.all_pairs_shortest_path()
+        self.assertRaises(KeyError, lambda: d[('a', 'x')])
+
+    def test_paths_from(self):
+        g = build_graph('ab bc cd ad da')
+        tree = g.paths_from('b')
+        self.assertEqual(tree['a'], (3, ('c', 'd', 'a')))
+        self.assertEqual(tree['b'], (0, ()))
+        self.assertEqual(g.d, None)
+
+    def test_path_tree_arrays(self):
+        g = build_graph('ab bc')
+        tree = g.paths_from('b')
+        index = g.numbers().index
+        self.assertEqual(tree.cost.typecode, 'i')
+        self.assertEqual(tree.cost[index['c']], 1)
+        self.assertEqual(tree.cost[index['a']], -1)
+        self.assertEqual(tree.prev[index['c']], index['b'])
+        self.assertEqual(dict(tree.dist), {'b': 0, 'c': 1})
+
+    def test_paths_new_vert(self):
+        g = build_graph('ab bc')
+        d = g.all_pairs_shortest_path()
+        x = g.add_vert('x')
+        self.assertEqual(d[('x', 'x')], (0, ()))
+        self.assertEqual(d[('a', 'x')], (graph.inf, None))
+        g.add_edge(g.V['c'], x)
+        self.assertEqual(d[('a', 'x')], (3, ('b', 'c', 'x')))
+        self.assertEqual(len(d.trees['a'].dist), 4)
+
+    def test_paths_from_lru(self):
+        g = build_graph('ab bc ca')
+        g.trees_kept = 2
+        a = g.paths_from('a')
+        g.paths_from('b')
+        self.assertTrue(g.paths_from('a') is a)
+        g.paths_from('c')
+        self.assertEqual(list(g.trees), ['a', 'c'])
+
+    def test_paths_from_changed(self):
+        g = build_graph('ab bc')
+        self.assertEqual(g.paths_from('a')['c'], (2, ('b', 'c')))
+        g.add_edge(g.V['a'], g.V['c'])
+        self.assertEqual(g.paths_from('a')['c'], (1, ('c',)))
+
+    def test_paths_repaired(self):
+        g = build_graph('ab bc cd ad da')
+        d = g.all_pairs_shortest_path()
+        tree = g.paths_from('a')
+        g.del_edge(g.E['a-d'])
+        self.assertTrue(g.d is d and g.paths_from('a') is tree)
+        self.assertEqual(tree['d'], (3, ('b', 'c', 'd')))
+        g.add_edge(g.V['b'], g.V['d'])
+        self.assertEqual(tree['d'], (2, ('b', 'd')))
+        self.assertEqual(d[('c', 'a')], (2, ('d', 'a')))
+
+    def test_paths_repaired_unaffected(self):
+        g = build_graph('ab bc ca')
+        tree = g.paths_from('a')
+        g.add_edge(g.V['a'], g.V['b'])
+        g.del_edge(g.E['a-b'])
+        self.assertTrue(g.paths_from('a') is tree)
+        self.assertEqual(tree['b'], (1, ('b',)))
+
+    def test_paths_repaired_copy(self):
+        g = build_graph('ab bc cd')
+        g.all_pairs_shortest_path()
+        h = g.copy()
+        h.del_edge(h.E['b-c'])
+        self.assertEqual(h.paths_from('a')['d'], (graph.inf, None))
+        self.assertEqual(g.paths_from('a')['d'], (3, ('b', 'c', 'd')))
+
+    def test_paths_repaired_del_vert(self):
+        g = build_graph('ab ac bd cd')
+        g.all_pairs_shortest_path()
+        g.del_vert(g.V['b'])
+        self.assertEqual(sorted(g.d.trees), ['a', 'c', 'd'])
+        self.assertEqual(g.paths_from('a')['d'], (2, ('c', 'd')))
+
+    def test_paths_repaired_replace_vert(self):
+        g = build_graph('ab bc cd')
+        tree = g.paths_from('a')
+        g.replace_vert(g.V['b'].without_edge_by_id('b-c'))
+        g.replace_vert(g.V['c'].without_edge_by_id('b-c'))
+        self.assertEqual(tree['c'], (graph.inf, None))
+        self.assertEqual(tree['d'], (graph.inf, None))
+        self.assertTrue(g.paths_from('a') is tree)
+
     def test_is_stuck(self):
         g = gg(dict(g0V), dict(g0E))
         g.d = g.all_pairs_shortest_path()
         self.assertFalse(g.is_stuck(g0a))
         self.assertTrue(g.is_stuck(g0b))
 
+    def test_components(self):
+        g = build_graph('ab ba bc cd dc de')
+        scc = g.components()
+        self.assertEqual(sorted(map(sorted, scc.members)),
+                         [['a', 'b'], ['c', 'd'], ['e']])
+        self.assertTrue(scc.comp['a'] > scc.comp['c'] > scc.comp['e'])
+        self.assertEqual(scc.sinks, [scc.comp['e']])
+        self.assertTrue(g.components() is scc)
+
+    def test_reaches(self):
+        g = build_graph('ab ba bc cd dc de')
+        self.assertTrue(g.reaches('a', 'e'))
+        self.assertTrue(g.reaches('d', 'c'))
+        self.assertTrue(g.reaches('e', 'e'))
+        self.assertFalse(g.reaches('c', 'a'))
+        self.assertFalse(g.reaches('e', 'd'))
+
+        scc = g.components()
+        self.assertEqual(sorted(scc.reached),
+                         sorted(scc.comp[v] for v in 'ade'))
+        self.assertEqual(scc.reach(scc.comp['c']),
+                         set([scc.comp['c'], scc.comp['e']]))
+
+    def test_is_stuck_self_loop(self):
+        g = graph.Graph.build(
+            [('a', 'a'), ('b', 'b'), ('c', 'c')],
+            [('ab', 'ab', 'a', 'b'), ('bc', 'bc', 'b', 'c'),
+             ('cc', 'cc', 'c', 'c')])
+        self.assertFalse(g.is_stuck(g.V['b']))
+        self.assertTrue(g.is_stuck(g.V['c']))
+        g.add_edge(g.V['c'], g.V['a'])
+        self.assertFalse(g.is_stuck(g.V['c']))
+
+    def test_components_deep(self):
+        n = 5000
+        g = graph.Graph.build(
+            [(i, str(i)) for i in range(n + 1)],
+            [('e%d' % i, None, i, i + 1) for i in range(n)])
+        self.assertEqual(len(g.components().members), n + 1)
+
     def test_eulerize(self):
         g0 = build_graph('ab ac bd cd de ea')
         self.assertEqual(g0.odd_verts(), (['d'], ['a']))
         g0.eulerize()
         self.assertEqual(g0.odd_verts(), ([], []))
 
+    def test_eulerize_stats(self):
+        g0 = build_graph('ab ac bd cd de ea')
+        g0.eulerize()
+        self.assertEqual(g0.stats['eulerize']['duplicated'], 2)
+        self.assertEqual(len(g0.E), 8)
+
     def test_eulerize_with_dupes(self):
         g0 = build_graph('ab ac bd cd de ea ea')
         self.assertEqual(g0.odd_verts(), (['d'], ['e']))
@@ -274,7 +460,14 @@ class TestGraph(unittest.TestCase):
 
     def test_eulerize_eulerian(self):
         g0 = build_graph('ab ac ba bc ca cb')
+        g0.stats['eulerize'] = {'duplicated': 5}
         self.assertEqual(None, g0.eulerize())
+        self.assertEqual(g0.stats['eulerize']['duplicated'], 0)
+
+    def test_odd_verts_multiple(self):
+        g0 = build_graph('ab ab ab cb')
+        self.assertEqual(map(sorted, g0.odd_verts()),
+                         [['b'] * 4, ['a'] * 3 + ['c']])
 
     def test_combine(self):
         g1 = build_graph('ab ac bd cd')
@@ -282,6 +475,49 @@ class TestGraph(unittest.TestCase):
         g3 = g1.combine(g2)
         self.assertEqual(g3, build_graph('ab ac bd cd de ea'))
 
+    def test_merge(self):
+        g1 = build_graph('ab ac bd cd')
+        g2 = build_graph('de ea')
+        g3 = build_graph('ab ea')
+        g4 = gg.merge([g1, g2, g3])
+        self.assertEqual(g4, build_graph('ab ac bd cd de ea'))
+        self.assertTrue(g4.sanity_check())
+
+        here = lambda n: os.path.join(os.path.dirname(__file__), n)
+        gs = [gg.read(here('examples/%s.tgf' % n))
+              for n in ('first', 'second', 'third')]
+        for graphs in [[g1, g2, g3], gs, gs[::-1]]:
+            g5 = reduce(lambda a, b: a.combine(b), graphs)
+            g6 = gg.merge(graphs)
+            self.assertEqual(list(g6.E), list(g5.E))
+            self.assertEqual(list(g6.V), list(g5.V))
+            for v_id in g5.V:
+                self.assertEqual(g6.V[v_id].outgoing, g5.V[v_id].outgoing)
+                self.assertEqual(g6.V[v_id].incoming, g5.V[v_id].incoming)
+
+    def test_merge_extras(self):
+        g1 = gg({'a': vv('a', 'a\nx=1', (), ())}, {})
+        g2 = gg({'a': vv('a', 'a\ny=2', (), ())}, {})
+        g3 = gg.merge([g1, g2])
+        self.assertEqual(g3.V['a'].extra, {'x': '1', 'y': '2'})
+
+    def test_merge_fail(self):
+        g1 = gg({'a': vv('a', 'a\nx=1', (), ())}, {})
+        g2 = gg({'a': vv('a', 'a\nx=2', (), ())}, {})
+        self.assertRaises(AssertionError, gg.merge, [g1, g2])
+
+    def test_merge_fail_edge(self):
+        g1 = build_graph('ab')
+        g2 = build_graph('ba')
+        g2.E['a-b'] = g2.E.pop('b-a')._replace(id='a-b')
+        self.assertRaises(AssertionError, gg.merge, [g1, g2])
+
+    def test_unparse_name(self):
+        label = graph.unparse_name('n', {'weight': '0.5', 'BLOCKED': True})
+        self.assertEqual(label, 'n\nBLOCKED\nweight=0.5')
+        self.assertEqual(graph.parse_name(label),
+                         ('n', {'weight': '0.5', 'BLOCKED': True}))
+
 
 class TestGraphIO(unittest.TestCase):
     class GraphSub(graph.Graph):
@@ -347,6 +583,17 @@ class TestGraphIO(unittest.TestCase):
             gs.file._inst.calls,
             [('__enter__'), ('read', None), ('__exit__', None, None, None)])
 
+    def test_binary_file_ops(self):
+        gs = self.build()
+        gs.Codec.binary = True
+        try:
+            gs.read('fleb.mef')
+            self.assertEqual(gs.file._inst.al, ("fleb.mef", 'rb'))
+            gs.read('fleb.mef').write('fleb.mef')
+            self.assertEqual(gs.file._inst.al, ("fleb.mef", 'wb'))
+        finally:
+            del gs.Codec.binary
+
     def test_read_codec_ops(self):
         gs = self.build()
         gs.read('fleb.mef')
@@ -355,6 +602,12 @@ class TestGraphIO(unittest.TestCase):
             gs._codec.calls,
             [('__init__', 'fleb.mef'), ('deserialize', '<mefl>')])
 
+    def test_parse_result(self):
+        gs = self.build()
+        verts, edges = gs.parse('fleb.mef')
+        self.assertEqual(verts, [('a_id', 'a_name'), ('b_id', 'b_name')])
+        self.assertEqual(edges, [('e_id', 'e_name', 'a_id', 'b_id')])
+
     def test_read_result_types(self):
         gs = self.build()
         g = gs.read('fleb.mef')
@@ -414,6 +667,24 @@ class TestGraphIO(unittest.TestCase):
         self.assertEqual(sorted(g.E.keys()), ['y_id'])
         self.assertEqual(sorted(g.V.keys()), ['a_id', 'c_id'])
 
+    def test_read_result_blocked_adjacent(self):
+        gs = self.build()
+        c = gs.Codec('mef')
+        gs.get_codec = staticmethod(lambda *al: c)
+        e0 = ('e_id', 'e_name', 'a_id', 'b_id')
+        e1 = ('x_id', 'x_name\nBLOCKED', 'b_id', 'a_id')
+        e2 = ('y_id', 'y_name', 'a_id', 'c_id')
+        v0 = ('a_id', 'a_name')
+        v1 = ('b_id', 'b_name')
+        v2 = ('c_id', 'c_name\nBLOCKED')
+        c.ve = [v0, v1, v2], [e0, e1, e2]
+        g = gs.read('fleb.mef')
+
+        self.assertTrue(g.sanity_check())
+        self.assertEqual(g.V['a_id'].outgoing, (g.E['e_id'],))
+        self.assertEqual(g.V['a_id'].incoming, ())
+        self.assertEqual(g.V['b_id'].outgoing, ())
+
     def test_read_result_blocked_none(self):
         gs = self.build()
         c = gs.Codec('mef')
@@ -467,3 +738,32 @@ class TestGraphIO(unittest.TestCase):
         self.assertEqual(
             gs.file._inst.calls,
             [('__enter__'), ('write', 'x'), ('__exit__', None, None, None)])
+
+    def test_write_document(self):
+        built = []
+
+        class Document(object):
+            def __init__(self, VE):
+                built.append(VE)
+
+            def write(self, f, name, **kw):
+                f.write((name, kw))
+
+        class codec(object):
+            pass
+        codec.Document = Document
+
+        gs = self.build()
+        gs.get_codec = staticmethod(lambda name: codec)
+        g = gs()
+        g.write('a.dot', highlight=('x',))
+        g.write('b.dot', highlight=('y',))
+        self.assertEqual(len(built), 1)
+        self.assertEqual(
+            gs.file._inst.calls,
+            [('__enter__'), ('write', ('b', {'highlight': ('y',)})),
+             ('__exit__', None, None, None)])
+
+        g.add_vert('v')
+        g.write('c.dot')
+        self.assertEqual(len(built), 2)
@@ -44,3 +44,37 @@ class TestGraphml(unittest.TestCase):
              ('e4', 'e_cd', 'n3', 'n4'),
              ('e5', 'e_de', 'n4', 'n5'),
              ('e6', 'e_ea', 'n5', 'n1')])
+
+    def test_nested_and_unlabeled(self):
+        d = """<?xml version="1.0" encoding="UTF-8"?>
+<graphml xmlns="http://graphml.graphdrawing.org/xmlns"
+         xmlns:y="http://www.yworks.com/xml/graphml">
+  <graph edgedefault="directed" id="G">
+    <node id="n0"><data><y:ProxyAutoBoundsNode><y:Realizers>
+      <y:GroupNode><y:NodeLabel> group </y:NodeLabel></y:GroupNode>
+    </y:Realizers></y:ProxyAutoBoundsNode></data>
+      <graph id="n0:">
+        <node id="n0::n0"><data><y:ShapeNode>
+          <y:Fill color="#FFCC00"/><y:NodeLabel>inner</y:NodeLabel>
+        </y:ShapeNode></data></node>
+      </graph>
+    </node>
+    <node id="n1"/>
+    <edge id="e0" source="n0::n0" target="n0"/>
+    <edge id="e1" source="n0" target="n0::n0"><data><y:PolyLineEdge>
+      <y:EdgeLabel>e_one</y:EdgeLabel><y:EdgeLabel>e_two</y:EdgeLabel>
+    </y:PolyLineEdge></data></edge>
+  </graph>
+</graphml>
+"""
+        verts, edges = graphml.deserialize(d)
+        self.assertEqual(verts, [('n0', 'group'), ('n0::n0', 'inner')])
+        self.assertEqual(edges, [('e0', None, 'n0::n0', 'n0'),
+                                 ('e1', 'e_one', 'n0', 'n0::n0')])
+
+    def test_file(self):
+        with file(self.here('examples/odd.graphml')) as f:
+            streamed = graphml.deserialize_file(f)
+        with file(self.here('examples/odd.graphml')) as f:
+            self.assertEqual(streamed, graphml.deserialize(f.read()))
+        self.assertEqual(len(streamed[0]), 6)
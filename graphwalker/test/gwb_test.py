@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Spotify AB
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from graphwalker import compact
+from graphwalker import graph
+from graphwalker import gwb
+
+
+def verts(g):
+    return sorted((v.id, v.name, sorted(v.outgoing), sorted(v.incoming),
+                   v.extra) for v in g.V.values())
+
+
+class TestGwb(unittest.TestCase):
+    here = lambda s, n: os.path.join(os.path.dirname(__file__), n)
+
+    verts = [('a', 'Start'), ('b', u'v_bå'), ('c', 'v_c\nweight=2')]
+    edges = [('e1', 'e_one', 'a', 'b'), ('e2', None, 'b', 'c'),
+             ('e3', 'e_one', 'c', 'b')]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='graphwalker-gwb-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_round_trip(self):
+        verts, edges = gwb.deserialize(gwb.pack(self.verts, self.edges))
+        self.assertEqual(verts, self.verts)
+        self.assertEqual(edges, self.edges)
+
+    def test_index(self):
+        image = gwb.Image(gwb.pack(self.verts[::-1], self.edges))
+        self.assertEqual(image.vert_index['a'], 2)
+        self.assertEqual(image.edge_index[u'e3'], 2)
+        self.assertFalse('x' in image.vert_index)
+        self.assertRaises(KeyError, lambda: image.vert_index['aa'])
+
+    def test_write_read(self):
+        g = graph.Graph.read(self.here('examples/odd.graphml'))
+        fn = os.path.join(self.path, 'odd.gwb')
+        g.write(fn)
+
+        for cls in graph.Graph, compact.CompactGraph:
+            h = cls.read(fn)
+            self.assertEqual(verts(g), verts(h))
+            self.assertEqual(sorted(g.E.items()), sorted(h.E.items()))
+            self.assertEqual(g.paths_from('n0').dist, h.paths_from('n0').dist)
+
+    def test_compact_pickle(self):
+        fn = os.path.join(self.path, 'model.gwb')
+        with open(fn, 'wb') as f:
+            f.write(gwb.pack(self.verts, self.edges))
+
+        g = compact.CompactGraph.read(fn)
+        h = pickle.loads(pickle.dumps(g, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(sorted(g.V.items()), sorted(h.V.items()))
+        self.assertEqual(h.V['c'].weight, '2')
+
+    def test_main(self):
+        fn = os.path.join(self.path, 'odd.gwb')
+        self.assertEqual(
+            gwb.main(['gwb', self.here('examples/odd.tgf'), fn]), 0)
+        self.assertEqual(
+            verts(graph.Graph.read(fn)),
+            verts(graph.Graph.read(self.here('examples/odd.tgf'))))
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Spotify AB
+import StringIO
+import unittest
+
+from graphwalker import layout
+
+
+class TestLayout(unittest.TestCase):
+    plain = """\
+graph 1 1.5 3.5
+node n0 0.75 3.25 0.75 0.5 Start solid ellipse black lightgrey
+node n1 0.75 1.75 0.75 0.5 v_a solid ellipse black lightgrey
+node "a b" 0.75 0.25 1 0.5 "v \\"b\\"" solid ellipse black lightgrey
+edge n0 n1 4 0.75 3 0.75 2.75 0.75 2.25 0.75 2 e_zero 1 2.5 solid black
+edge n1 "a b" 4 0.5 1.5 0.5 1 0.5 1 0.5 0.5 solid black
+edge n1 "a b" 4 1 1.5 1 1 1 1 1 0.5 "e one" 1.25 1 solid black
+stop
+"""
+    E = {'e0': ('e0', 'e_zero', 'n0', 'n1'),
+         'e1': ('e1', 'e one', 'n1', 'a b'),
+         'e2': ('e2', None, 'n1', 'a b')}
+
+    def test_parse(self):
+        l = layout.parse_plain(self.plain, self.E)
+        self.assertEqual((l.width, l.height), (108, 252))
+        self.assertEqual(l.nodes['n0'], (54, 18, 54, 36, 'Start'))
+        self.assertEqual(l.nodes['a b'][-1], 'v "b"')
+        self.assertEqual(sorted(l.edges), ['e0', 'e1', 'e2'])
+        self.assertEqual(l.edges['e0'],
+                         ([(54, 36), (54, 54), (54, 90), (54, 108)],
+                          'e_zero', (72, 72)))
+        self.assertEqual(l.edges['e1'][1:], ('e one', (90, 180)))
+        self.assertEqual(l.edges['e2'][1:], (None, None))
+
+    def test_svg(self):
+        l = layout.parse_plain(self.plain, self.E)
+        f = StringIO.StringIO()
+        l.write_svg(f, ('e0', 'n1'))
+        svg = f.getvalue()
+
+        self.assertTrue(svg.startswith('<svg '))
+        self.assertTrue(svg.endswith('</svg>\n'))
+        self.assertTrue('<g id="gw-a b" class="">' in svg)
+        self.assertTrue(
+            '<path d="M54.0,36.0 C54.0,54.0 54.0,90.0 54.0,108.0"' in svg)
+        self.assertTrue('>v "b"<' in svg)
+
+        # The highlighted elements are drawn again, on top.
+        self.assertEqual(svg.count('id="gw-e0"'), 2)
+        self.assertEqual(svg.count('class="hl"'), 2)
+        self.assertTrue(svg.index('id="gw-e2"') < svg.index('class="hl"'))
+
+    def test_html(self):
+        l = layout.parse_plain(self.plain, self.E)
+        f = StringIO.StringIO()
+        l.write_html(f, ['n0', 'e0', 'n1', '</script>'], 'a <test>')
+        html = f.getvalue()
+
+        self.assertTrue('<title>a &lt;test&gt;</title>' in html)
+        self.assertTrue('max="3"' in html)
+        self.assertTrue('["n0", "e0", "n1", "<\\/script>"]' in html)
+        self.assertEqual(html.count('</script>'), 1)
+        self.assertTrue(l.body in html)
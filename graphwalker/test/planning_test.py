@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2013 Spotify AB
 import cStringIO
+import collections
+import logging
 import signal
 import unittest
 
+from graphwalker import graph
 from graphwalker import planning
 
 
@@ -24,6 +27,7 @@ class G(object):
     del_vert = lambda s, v: v
     eulerize = lambda s: s
     copy = lambda s: s
+    vert_by_name = graph.Graph.__dict__['vert_by_name']
 
     def vert_degrees(self):
         I = dict((v, 0) for v in self.V)
@@ -46,6 +50,14 @@ def build_graph(spec):
     return G(V, E)
 
 
+def paths_from(d):
+    def tree(fm):
+        t = collections.defaultdict(lambda: (planning.inf, None))
+        t.update((to, cp) for (f, to), cp in d.items() if f == fm)
+        return t
+    return tree
+
+
 class EhmNo(object):
     __nonzero__ = lambda s: False
     add = lambda s, x: False
@@ -93,6 +105,20 @@ class TestPlanner(unittest.TestCase):
         p.forced_plan()
         self.assertEqual([s[0] for s in p.plan], ['ab', 'b'])
 
+    def test_forced_plan_chain(self):
+        g = graph.Graph()
+        for v in 'abcdef':
+            g.add_vert(v)
+        for f, t in 'ab bc cd de ef fd'.split():
+            g.add_edge(g.V[f], g.V[t], f + t)
+
+        p = planning.Planner(seed='cthulhu')
+        p._setup(g, EhmNo(), 'a', '<ctx>')
+        p.forced_plan()
+        self.assertEqual([s[0] for s in p.plan],
+                         ['ab', 'b', 'bc', 'c', 'cd', 'd'])
+        self.assertEqual(sorted(g.V), ['d', 'e', 'f'])
+
     def test_visit_own(self):
         p = planning.Planner(seed='cthulhu')
         p.stop, p.plan = set(), []
@@ -230,6 +256,31 @@ class TestRandom(TestEvenRandom):
 
         self.assertEqual(p.rng.calls, calls)
 
+    def test_tables_compiled_once(self):
+        g = build_graph('ab bc cb bb cc')
+        g.E['bb'] = Thing(('bb', 'bb', 'b', 'b', '25%'))
+        g.V['b'].outgoing[0] = g.E['bb']
+        compiled = []
+
+        class Sub(self.thiscls):
+            def compile(self, edges):
+                compiled.append(edges)
+                return planning.Random.compile(edges)
+
+        p = Sub()
+        p.rng = rng()
+        plan = zip(p(g, EhmNo(), 'a', 'context'), range(20))
+        self.assertEqual(len(plan), 20)
+        self.assertEqual(len(compiled), 3)
+
+    def test_tables_changed_edges(self):
+        p = self.thiscls()
+        p.rng = rng()
+        edges = [Thing(('ab', 'ab', 'a', 'b', '1'))]
+        self.assertEqual(p.choose_edge(edges), edges[0])
+        edges = [Thing(('aa', 'aa', 'a', 'a', '1'))]
+        self.assertEqual(p.choose_edge(edges), edges[0])
+
 
 class timeout(object):
     @staticmethod
@@ -283,6 +334,20 @@ class TestEuler(unittest.TestCase):
         plan = p(g, Some(), 'a', '<context>')
         self.assertEqual([x[0] for x in plan], ['ab', 'b', 'bc'])
 
+    def test_circuit(self):
+        g = build_graph('ab bc ca ad da bb cd dc')
+        p = planning.Euler()
+        p.forced_plan = lambda *al: None
+        plan = p(g, EhmNo(), 'a', '<context>')
+        edges = plan[0::2]
+        self.assertEqual(sorted(e[0] for e in edges), sorted(g.E))
+        self.assertEqual(edges[0].src, 'a')
+        self.assertEqual(plan[-1], g.V['a'])
+        for e, v in zip(edges, plan[1::2]):
+            self.assertEqual(e.tgt, v.id)
+        for e, f in zip(edges, edges[1:]):
+            self.assertEqual(e.tgt, f.src)
+
     def test_completes(self):
         g = build_graph('ab bc cb ba')
         p = planning.Euler()
@@ -291,6 +356,52 @@ class TestEuler(unittest.TestCase):
             p(g, EhmNo(), 'a', '<context>')
 
 
+class TestStreamingEuler(unittest.TestCase):
+    def test_ctor_smoke(self):
+        self.assert_(planning.StreamingEuler())
+
+    def plan(self, spec, stop=None):
+        g = build_graph(spec)
+        p = planning.StreamingEuler()
+        p.forced_plan = lambda *al: None
+        stop = stop if stop is not None else EhmNo()
+        return g, p(g, stop, 'a', '<context>')
+
+    def test_circuit(self):
+        g, plan = self.plan('ab bc ca ad da bb cd dc')
+        plan = list(plan)
+        edges = plan[0::2]
+        self.assertEqual(sorted(e[0] for e in edges), sorted(g.E))
+        self.assertEqual(plan[-1], g.V['a'])
+        for e, f in zip(edges, edges[1:]):
+            self.assertEqual(e.tgt, f.src)
+
+    def test_streams(self):
+        g, plan = self.plan('ab ba ac ca')
+        self.assertEqual(next(plan)[0], 'ab')
+
+    def test_early_stop(self):
+        class Some(EhmNo):
+            __nonzero__ = lambda s: s.stops.pop(0)
+        stop = Some()
+        stop.stops = [0, 0, 0, 1]
+        g, plan = self.plan('ab bc cd de ef fg gh ha', stop)
+        self.assertEqual([x[0] for x in plan], ['ab', 'b', 'bc'])
+
+    def test_fail_non_euler(self):
+        g, plan = self.plan('ab bc bd')
+        self.assertRaises(AssertionError, list, plan)
+
+    def test_fail_non_connected(self):
+        g, plan = self.plan('ab ba de ed')
+        try:
+            list(plan)
+        except AssertionError as e:
+            self.assertEqual(e.args, ("Graph is not connected",))
+        else:
+            self.assert_(False, "Expected exception")
+
+
 class TestGoto(unittest.TestCase):
     def test_ctor_smoke(self):
         self.assert_(planning.Goto())
@@ -299,8 +410,9 @@ class TestGoto(unittest.TestCase):
         g = build_graph('ab ac ad bc dc')
         d = {('a', 'b'): (1, 'b'), ('a', 'c'): (1, 'c'), ('a', 'd'): (1, 'd'),
              ('b', 'c'): (1, 'c'), ('d', 'c'): (1, 'c')}
-        g.all_pairs_shortest_path = lambda *al: d
+        g.paths_from = paths_from(d)
         g.is_stuck = lambda *al: False
+        g.reaches = lambda *al: True
         p = planning.Goto('c')
         plan = p(g, EhmNo(), 'a', '<context>')
         self.assertEqual([x[0] for x in plan], ['ac', 'c'])
@@ -321,8 +433,9 @@ class TestGoto(unittest.TestCase):
             ('d', 'b'): (2, 'ab'),
             ('d', 'c'): (3, 'abc'),
         }
-        g.all_pairs_shortest_path = lambda *al: d
+        g.paths_from = paths_from(d)
         g.is_stuck = lambda *al: False
+        g.reaches = lambda *al: True
         p = planning.Goto(*'dcba')
         plan = p(g, EhmNo(), 'a', '<context>')
         self.assertEqual(
@@ -330,6 +443,33 @@ class TestGoto(unittest.TestCase):
             'ab-b-bc-c-cd-d-da-a-ab-b-bc-c-cd-d-da-a-ab-b-bc-c-cd-d-da-a')
         #  a ->         d ->             c ->           b ->           a
 
+    def test_random_repeat(self):
+        g = graph.Graph.build(
+            [('a', 'Start'), ('b', 'b'), ('c', 'c')],
+            [('ab', 'ab', 'a', 'b'), ('bc', 'bc', 'b', 'c'),
+             ('cb', 'cb', 'c', 'b')])
+        p = planning.Goto('random', repeat='5', seed=1)
+        plan = p(g, EhmNo(), 'Start', '<context>')
+        self.assertEqual(plan[:2], [g.E['ab'], g.V['b']])
+        self.assertTrue(len(plan) > 2)
+
+    def test_unreachable_goal(self):
+        g = graph.Graph.build(
+            [('a', 'Start'), ('b', 'b'), ('c', 'c')],
+            [('ab', 'ab', 'a', 'b'), ('ca', 'ca', 'c', 'a')])
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        planning.log.addHandler(handler)
+        try:
+            plan = planning.Goto('c', 'b')(g, EhmNo(), 'Start', '<context>')
+        finally:
+            planning.log.removeHandler(handler)
+
+        self.assertEqual([r.getMessage() for r in records],
+                         ["Goal c can not be reached from Start"])
+        self.assertEqual(plan, [g.E['ab'], g.V['b']])
+
 
 class TestInteractive(unittest.TestCase):
     def test_ctor_smoke(self):
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2013 Spotify AB
+import contextlib
 import logging
 import StringIO
+import threading
 import unittest
 
 from graphwalker import reporting
@@ -142,14 +144,14 @@ class TestPathRecorder(TestReporter):
 
 
 class TestCartographer(TestReporter):
-    def build(self):
+    def build(self, **kw):
         m = []
 
         class model:
             def write(self, fn, highlight):
                 m.append((fn, highlight))
 
-        r = reporting.Cartographer()
+        r = reporting.Cartographer(**kw)
         r.context['system_calls'] = []
         r.system = lambda c: r.context['system_calls'].append(c)
         r.context['model_writes'] = m
@@ -168,6 +170,182 @@ class TestCartographer(TestReporter):
             [('./test_name_0000.dot', ('id0',)),
              ('./test_name_0001.dot', ('id1',))])
 
+    def test_in_step(self):
+        r = self.build(jobs='0')
+        r.initiate('t')
+        r.step_begin(('id0', 'name0'))
+        self.assertEqual(r.context['system_calls'],
+                         ['dot -Tpng -o ./t_0000.png ./t_0000.dot'])
+
+    def steps(self, r, n):
+        r.initiate('t')
+        for i in range(n):
+            r.step_begin(('id%d' % i, 'name%d' % i))
+        r.finalize()
+        return [c.split()[-1] for c in r.context['system_calls']]
+
+    def test_last(self):
+        r = self.build(policy='last', keep='2', jobs='3')
+        self.assertEqual(
+            sorted(self.steps(r, 5)), ['./t_0003.dot', './t_0004.dot'])
+        self.assertEqual(len(r.context['model_writes']), 5)
+
+    def test_drop(self):
+        r = self.build(policy='drop', keep='2', jobs='1')
+        started, go = threading.Event(), threading.Event()
+
+        def system(c):
+            r.context['system_calls'].append(c)
+            started.set()
+            go.wait()
+
+        r.system = system
+        r.initiate('t')
+        r.step_begin(('id0', 'name0'))
+        started.wait()
+        for i in range(1, 5):
+            r.step_begin(('id%d' % i, 'name%d' % i))
+        go.set()
+        r.finalize()
+
+        self.assertEqual(
+            [c.split()[-1] for c in r.context['system_calls']],
+            ['./t_0000.dot', './t_0003.dot', './t_0004.dot'])
+
+    def test_batch(self):
+        r = self.build(batch='3', jobs='0')
+        renames = r.context['renames'] = []
+        r.rename = lambda a, b: renames.append((a, b))
+        self.steps(r, 4)
+
+        self.assertEqual(
+            r.context['system_calls'],
+            ['dot -Tpng -O ./t_0000.dot ./t_0001.dot ./t_0002.dot',
+             'dot -Tpng -o ./t_0003.png ./t_0003.dot'])
+        self.assertEqual(
+            renames,
+            [('./t_%04d.dot.png' % i, './t_%04d.png' % i) for i in range(3)])
+
+    def test_attach(self):
+        attached = []
+
+        class reporter:
+            def attach_to_step(self, name, data):
+                attached.append((name, data))
+
+        r = self.build(attach=True, jobs='2', policy='block', keep='1')
+        r.context['reporter'] = reporter()
+        r.file = lambda fn: contextlib.closing(StringIO.StringIO(fn))
+        r.system = lambda c: c.endswith('1.dot')
+
+        self.steps(r, 4)
+        self.assertEqual(
+            sorted(attached),
+            [('./t_%04d.dot' % i, './t_%04d.png' % i) for i in (0, 2, 3)])
+
+    def attaching(self, **kw):
+        attached = []
+
+        class reporter:
+            def attach_to_step(self, name, data):
+                attached.append((name, data))
+
+        r = self.build(attach=True, **kw)
+        r.context['reporter'] = reporter()
+        r.file = lambda fn: contextlib.closing(StringIO.StringIO(fn))
+        r.initiate('t')
+        return r, attached
+
+    def test_attach_in_step(self):
+        r, attached = self.attaching()
+        r.step_begin(('id0', 'name0'))
+        self.assertEqual(attached, [('./t_0000.dot', './t_0000.png')])
+
+    def test_attach_later(self):
+        r, attached = self.attaching(jobs='1')
+        go = threading.Event()
+
+        def system(c):
+            go.wait()
+            return 0
+
+        r.system = system
+
+        r.step_begin(('id0', 'name0'))
+        self.assertEqual(attached, [])
+        go.set()
+        r.finalize()
+        self.assertEqual(attached, [('./t_0000.dot', './t_0000.png')])
+
+
+class TestAtlas(TestReporter):
+    plain = """\
+graph 1 1 1
+node id0 0.5 0.5 0.5 0.5 a solid ellipse black lightgrey
+node id1 0.5 0.5 0.5 0.5 b solid ellipse black lightgrey
+stop
+"""
+
+    def build(self, **kw):
+        files, commands = {}, []
+
+        class model:
+            E, version = {}, 1
+
+            def write(self, fn):
+                files[fn] = 'digraph {}'
+
+        class fake(StringIO.StringIO):
+            def __init__(self, fn, mode='r'):
+                StringIO.StringIO.__init__(self, files.get(fn, ''))
+                self.fn, self.mode = fn, mode
+
+            def __exit__(self, t, v, tb):
+                if 'w' in self.mode:
+                    files[self.fn] = self.getvalue()
+
+            __enter__ = lambda self: self
+
+        def output(command):
+            commands.append(command)
+            return self.plain
+
+        r = reporting.Atlas(**kw)
+        r.file, r.output = fake, output
+        r.context.update(model=model(), files=files, commands=commands)
+        return r
+
+    def test_html(self):
+        r = self.exercise_pass(self.build(path='/x'))
+
+        self.assertEqual(sorted(r.context['files']),
+                         ['/x/test_name.dot', '/x/test_name.html'])
+        self.assertTrue('["id0", "id1"]' in r.context['files'][
+            '/x/test_name.html'])
+        self.assertEqual(r.context['commands'],
+                         ['dot -Tplain /x/test_name.dot'])
+
+    def test_svg(self):
+        r = self.build(format='svg', name='n', attach=True)
+        attached = []
+
+        class reporter:
+            def attach_to_step(self, name, data):
+                attached.append(name)
+
+        r.context['reporter'] = reporter()
+        self.exercise_pass(r)
+
+        self.assertEqual(sorted(r.context['files']),
+                         ['./n.dot', './n_0000.svg', './n_0001.svg'])
+        self.assertEqual(len(r.context['commands']), 1)
+        self.assertEqual(attached, ['n_0000.svg', 'n_0001.svg'])
+
+        r.context['model'].version = 2
+        r.initiate('again')
+        r.step_begin(('id0', 'name0'))
+        self.assertEqual(len(r.context['commands']), 2)
+
 
 class TestAttachments(TestReporter):
     def build(self, path=None):
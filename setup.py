@@ -15,7 +15,7 @@ setup(
     license='LICENSE.txt',
     description='Finite state machine based testing tool.',
     long_description=open('README.txt').read(),
-    requires=["pydot(>=1.0.2)", "docopt"],
+    requires=["docopt"],
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',